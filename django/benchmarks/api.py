@@ -0,0 +1,187 @@
+"""Drive every route of blog.urls through the test client and check for regressions.
+
+Seeds a throwaway database with ``seed_blog``, times each scenario below and
+prints throughput, latency percentiles and the per-request query count as
+JSON. With a baseline file (``benchmarks/baseline.json`` by default) every
+scenario is compared against it; the exit status is 1 when a median latency
+grew by more than --threshold or a scenario issues more queries than before.
+``--update-baseline`` rewrites the file from the current run instead.
+Latencies are machine specific, so refresh the baseline on the machine that
+runs the comparison.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+from benchmarks import common
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+PASSWORD = 'seed-password'
+# Signup and signin hash a password on every request, so they get fewer iterations
+AUTH_ITERATIONS = 5
+# Streams never finish on their own; benchmarks/comment_stream.py measures the fan-out instead
+UNTIMED_ROUTES = {'comment_stream'}
+
+
+def scenarios(state, n):
+    """(name, url name, method, requests) where requests is a list of (client, path, body)."""
+    client = state['client']
+    articles, comments = state['articles'], state['comments']
+    hot = state['hot_article']
+    m = min(n, AUTH_ITERATIONS)
+    return [
+        ('signup', 'signup', 'post', [(state['anonymous'](), '/api/signup', {'username': 'bench%d' % i, 'password': PASSWORD}) for i in range(m)]),
+        ('token', 'token', 'get', [(client, '/api/token', None)] * n),
+        ('signin', 'signin', 'post', [(state['anonymous'](), '/api/signin', {'username': 'seed0', 'password': PASSWORD}) for _ in range(m)]),
+        ('signout', 'signout', 'get', [(state['logged_in'](), '/api/signout', None) for _ in range(n)]),
+        ('article_list', 'article', 'get', [(client, '/api/article?limit=20', None)] * n),
+        ('article_list_counts', 'article', 'get', [(client, '/api/article?limit=20&comment_count', None)] * n),
+        ('article_create', 'article', 'post', [(client, '/api/article', {'title': 'bench', 'content': 'bench'})] * n),
+        ('article_bulk_create', 'article_bulk', 'post', [(client, '/api/article/bulk', [{'title': 'bench', 'content': 'bench'}] * 20)] * n),
+        ('article_bulk_update', 'article_bulk', 'put', [(client, '/api/article/bulk', [{'id': i, 'title': 'bulk', 'content': 'bulk'} for i in articles[:20]])] * n),
+        ('article_bulk_delete', 'article_bulk', 'delete', [(client, '/api/article/bulk', articles[i * 5:(i + 1) * 5]) for i in range(n)]),
+        ('article_search', 'article_search', 'get', [(client, '/api/article/search?q=django+cache&limit=20', None)] * n),
+        ('article_get', 'article_detail', 'get', [(client, '/api/article/%d' % hot, None)] * n),
+        ('article_update', 'article_detail', 'put', [(client, '/api/article/%d' % hot, {'title': 'bench', 'content': 'bench'})] * n),
+        ('article_delete', 'article_detail', 'delete', [(client, '/api/article/%d' % i, None) for i in articles[n * 5:n * 6]]),
+        ('comment_list', 'comment', 'get', [(client, '/api/article/%d/comment' % hot, None)] * n),
+        ('comment_create', 'comment', 'post', [(client, '/api/article/%d/comment' % hot, {'content': 'bench'})] * n),
+        ('article_comment_bulk', 'article_comment_bulk', 'post', [(client, '/api/article/%d/comment/bulk' % hot, [{'content': 'bench'}] * 20)] * n),
+        ('comment_bulk_update', 'comment_bulk', 'put', [(client, '/api/comment/bulk', [{'id': i, 'content': 'bulk'} for i in comments[:20]])] * n),
+        ('comment_bulk_delete', 'comment_bulk', 'delete', [(client, '/api/comment/bulk', comments[20 + i * 5:20 + (i + 1) * 5]) for i in range(n)]),
+        ('comment_get', 'comment_detail', 'get', [(client, '/api/comment/%d' % comments[0], None)] * n),
+        ('comment_update', 'comment_detail', 'put', [(client, '/api/comment/%d' % comments[0], {'content': 'bench'})] * n),
+        ('comment_delete', 'comment_detail', 'delete', [(client, '/api/comment/%d' % i, None) for i in comments[20 + n * 5:20 + n * 6]]),
+        ('changes', 'changes', 'get', [(client, '/api/changes?since=0&limit=100', None)] * n),
+        ('metrics', 'metrics', 'get', [(client, '/api/_metrics', None)] * n),
+    ]
+
+def check_coverage(names):
+    from blog import urls
+    missing = {pattern.name for pattern in urls.urlpatterns} - set(names) - UNTIMED_ROUTES
+    if missing:
+        raise SystemExit('No scenario for route(s): %s' % ', '.join(sorted(missing)))
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run(route, method, requests):
+    from django.db import connection
+    from blog.metrics import QueryTimer
+    latencies, query_counts, statuses = [], [], set()
+    total_start = time.perf_counter()
+    for client, path, body in requests:
+        timer = QueryTimer()
+        data = json.dumps(body) if body is not None else ''
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = client.generic(method.upper(), path, data, content_type='application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        latencies.append(time.perf_counter() - start)
+        query_counts.append(timer.queries)
+        statuses.add(response.status_code)
+    total = time.perf_counter() - total_start
+    return {
+        'route': route,
+        'method': method.upper(),
+        'requests': len(requests),
+        'status': sorted(statuses),
+        'throughput_rps': round(len(requests) / total, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries': max(query_counts),
+    }
+
+def compare(results, baseline, threshold, min_delta_ms):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append('%s: %d queries, baseline %d' % (name, result['queries'], base['queries']))
+        limit = max(base['p50_ms'] * (1 + threshold), base['p50_ms'] + min_delta_ms)
+        if result['p50_ms'] > limit:
+            regressions.append('%s: p50 %.3fms, baseline %.3fms' % (name, result['p50_ms'], base['p50_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=1.0, help='allowed relative growth of the median latency')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='ignore median changes smaller than this')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from blog import caching, metrics
+    from blog.models import Article, Comment
+
+    setup_test_environment()
+    n = args.iterations
+    # Destructive scenarios consume fresh rows: 5 per bulk delete and 1 per single delete
+    with common.test_database(), override_settings(BLOG_RATE_LIMITS={}, BLOG_METRICS_ENDPOINT=True, BLOG_USER_CACHE_TTL=3600):
+        call_command('seed_blog', users=args.users, articles=args.articles, comments=args.comments, verbosity=0, stdout=open(os.devnull, 'w'))
+        user = User.objects.get(username='seed0')
+        Article.objects.bulk_create([Article(title='target', content='target', author=user) for _ in range(n * 6)])
+        hot = Article.objects.filter(author=user).exclude(title='target').order_by('-comment_count').values_list('id', flat=True).first()
+        if hot is None:
+            hot = Article.objects.create(title='hot', content='hot', author=user).id
+        Comment.objects.bulk_create([Comment(article_id=hot, content='target', author=user) for _ in range(20 + n * 6)])
+
+        def logged_in():
+            client = Client()
+            client.force_login(user)
+            return client
+
+        state = {
+            'client': logged_in(),
+            'anonymous': Client,
+            'logged_in': logged_in,
+            'hot_article': hot,
+            'articles': list(Article.objects.filter(title='target').order_by('id').values_list('id', flat=True)),
+            'comments': list(Comment.objects.filter(content='target').order_by('id').values_list('id', flat=True)),
+        }
+        plan = scenarios(state, n)
+        check_coverage(route for _, route, _, _ in plan)
+
+        caching.clear()
+        metrics.reset()
+        # Collector pauses land on random requests and dominate run-to-run noise
+        gc.collect()
+        gc.disable()
+        try:
+            results = {name: run(route, method, requests) for name, route, method, requests in plan}
+        finally:
+            gc.enable()
+
+    report = {'seed': {'users': args.users, 'articles': args.articles, 'comments': args.comments}, 'iterations': n, 'scenarios': results}
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report['regressions'] = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+    print(json.dumps(report, indent=2))
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Compare request throughput of the WSGI and ASGI entry points under slow clients.
+
+Starts gunicorn (sync workers, myblog.wsgi) and then uvicorn (myblog.asgi)
+with the same number of worker processes against a throwaway database.
+First --slow-clients connections download the whole article list
+(?stream=ndjson, about --seed-articles * 600 bytes). Each has a small
+receive buffer and reads --read-bytes every --slow-ms, the way a slow
+mobile client would. Once the socket buffers are full, the server is stuck
+writing that response. The slowness therefore starts after the server has
+taken the request, not while it waits in the accept queue. Only once
+every slow client has its first bytes are --requests small GETs sent from
+--concurrency threads. A sync worker stays pinned until its slow download
+ends. An event loop keeps serving other connections between writes.
+
+Requires gunicorn and uvicorn to be installed.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server on port %d did not start' % port)
+
+def request(port, method, path, body=None, cookies=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = dict(headers or {})
+    if cookies:
+        headers['Cookie'] = '; '.join('%s=%s' % item for item in cookies.items())
+    if body is not None:
+        body = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    for header in response.headers.get_all('Set-Cookie') or []:
+        cookie = SimpleCookie(header)
+        for key, morsel in cookie.items():
+            cookies[key] = morsel.value
+    return response.status
+
+def sign_in(port, seed_articles):
+    cookies = {}
+    request(port, 'GET', '/api/token', cookies=cookies)
+    csrf = {'X-CSRFToken': cookies['csrftoken']}
+    credentials = {'username': 'bench', 'password': 'bench-password'}
+    request(port, 'POST', '/api/signup', credentials, cookies, csrf)
+    request(port, 'POST', '/api/signin', credentials, cookies, csrf)
+    csrf = {'X-CSRFToken': cookies['csrftoken']}
+    for start in range(0, seed_articles, 500):
+        articles = [{'title': 'article %d' % i, 'content': 'x' * 500} for i in range(start, min(start + 500, seed_articles))]
+        request(port, 'POST', '/api/article/bulk', articles, cookies, csrf)
+    return cookies
+
+def raw_get(path, cookies):
+    return ('GET %s HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: %s\r\nConnection: close\r\n\r\n' % (
+        path, '; '.join('%s=%s' % item for item in cookies.items()))).encode()
+
+def slow_download(port, cookies, args, started):
+    """Read the streamed article list slowly; returns (status, bytes read, seconds)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Set before connecting, so the advertised window stays small
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, args.read_bytes)
+    sock.settimeout(120)
+    begin = time.perf_counter()
+    with sock:
+        sock.connect(('127.0.0.1', port))
+        sock.sendall(raw_get('/api/article?stream=ndjson', cookies))
+        first = sock.recv(args.read_bytes)
+        started.release()
+        received = len(first)
+        while True:
+            time.sleep(args.slow_ms / 1000)
+            data = sock.recv(args.read_bytes)
+            if not data:
+                break
+            received += len(data)
+    return int(first.split(b' ', 2)[1]), received, time.perf_counter() - begin
+
+def fast_get(port, path, cookies):
+    start = time.perf_counter()
+    status = request(port, 'GET', path, cookies=dict(cookies))
+    return status, time.perf_counter() - start
+
+def load(port, cookies, args):
+    rng = random.Random(0)
+    paths = [rng.choice(['/api/article/%d' % rng.randint(1, args.seed_articles), '/api/article/1/comment'])
+             for _ in range(args.requests)]
+    started = threading.Semaphore(0)
+    with ThreadPoolExecutor(max(args.slow_clients, 1)) as slow_pool:
+        downloads = [slow_pool.submit(slow_download, port, cookies, args, started) for _ in range(args.slow_clients)]
+        # Every slow client is being served before the fast requests go out
+        for _ in range(args.slow_clients):
+            started.acquire()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            results = list(pool.map(lambda path: fast_get(port, path, cookies), paths))
+        elapsed = time.perf_counter() - start
+        downloads = [download.result() for download in downloads]
+    latencies = sorted(seconds for _, seconds in results)
+    return {
+        'requests': args.requests,
+        'ok': sum(1 for status, _ in results if status == 200),
+        'seconds': round(elapsed, 2),
+        'requests_per_second': round(args.requests / elapsed, 1),
+        'latency_ms': {
+            'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+            'p99': round(latencies[int(len(latencies) * 0.99)] * 1000, 1),
+        },
+        'slow_downloads': {
+            'ok': sum(1 for status, _, _ in downloads if status == 200),
+            'bytes': min((received for _, received, _ in downloads), default=0),
+            'seconds': round(max((seconds for _, _, seconds in downloads), default=0), 2),
+        },
+    }
+
+def run_server(command, env, port, cookies, args, seed):
+    server = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        if seed:
+            cookies.update(sign_in(port, args.seed_articles))
+        return load(port, cookies, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--slow-clients', type=int, default=4)
+    parser.add_argument('--read-bytes', type=int, default=16384)
+    parser.add_argument('--slow-ms', type=int, default=50)
+    parser.add_argument('--seed-articles', type=int, default=2000)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    for tool in ['gunicorn', 'uvicorn']:
+        if shutil.which(tool) is None:
+            sys.exit('%s is not installed' % tool)
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, MYBLOG_DB_NAME=os.path.join(workdir, 'bench.sqlite3'), DJANGO_SETTINGS_MODULE='benchmarks.server_settings')
+    # The session and user caches are per process, so signed cookies keep sessions valid across workers
+    env['MYBLOG_SESSION_BACKEND'] = 'signed_cookies'
+    try:
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=BASE_DIR, env=env, check=True)
+        bind = '127.0.0.1:%d' % args.port
+        cookies = {}
+        report = {
+            'workers': args.workers, 'concurrency': args.concurrency, 'slow_clients': args.slow_clients,
+            'read_bytes': args.read_bytes, 'slow_ms': args.slow_ms,
+        }
+        report['wsgi'] = run_server(
+            ['gunicorn', '--workers', str(args.workers), '--bind', bind, 'myblog.wsgi:application'],
+            env, args.port, cookies, args, seed=True)
+        report['asgi'] = run_server(
+            ['uvicorn', '--workers', str(args.workers), '--port', str(args.port), '--log-level', 'warning', 'myblog.asgi:application'],
+            env, args.port, cookies, args, seed=False)
+        report['speedup'] = round(report['asgi']['requests_per_second'] / report['wsgi']['requests_per_second'], 2)
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Delete one heavily commented article: Django's collector vs blog.deletion."""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--comments', type=int, default=100000)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from django.utils import timezone
+    from blog import deletion
+    from blog.models import Article
+
+    with common.test_database() as connection:
+        user = User.objects.create_user(username='bench', password='bench')
+
+        def commented_article():
+            article = Article.objects.create(title='bench', content='bench', author=user)
+            now = timezone.now()
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(
+                    'INSERT INTO blog_comment (article_id, content, author_id, updated_at) VALUES (%s, %s, %s, %s)',
+                    [(article.id, 'comment %d' % i, user.id, now) for i in range(args.comments)])
+            # The raw INSERTs skip the signal that keeps the count, and draining subtracts from it
+            Article.objects.filter(id=article.id).update(comment_count=args.comments)
+            return article.id
+
+        def measure(delete):
+            article_id = commented_article()
+            tracemalloc.start()
+            start = time.perf_counter()
+            delete(article_id)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return {'seconds': round(elapsed, 3), 'peak_mb': round(peak / 2 ** 20, 1)}
+
+        def chunked(article_id):
+            deletion.drain_comments([article_id])
+            deletion.delete_articles([article_id])
+
+        report = {
+            'comments': args.comments,
+            'collector': measure(lambda article_id: Article.objects.filter(id=article_id).delete()),
+            'raw': measure(lambda article_id: deletion.delete_articles([article_id])),
+            'chunked': measure(chunked),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
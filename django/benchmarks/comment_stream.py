@@ -0,0 +1,108 @@
+"""Fan-out cost of /api/article/<id>/comment/stream against polling.
+
+Opens --watchers async streams (blog.live.astream, as the ASGI view serves
+them) on one article, then creates --comments comments through the ORM.
+Reports memory per idle watcher, delivery latency from commit to every
+watcher and how many were dropped. Idle watchers run no queries at all.
+For comparison it also times the comment list GET that a polling client
+repeats every --poll-interval seconds.
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from benchmarks import common
+
+POLLS = 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--watchers', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=20)
+    parser.add_argument('--idle', type=float, default=2.0, help='seconds the watchers sit idle before the first comment')
+    parser.add_argument('--poll-interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from blog import live
+    from blog.metrics import QueryTimer
+    from blog.models import Article, Comment
+
+    setup_test_environment()
+    with common.test_database(), override_settings(BLOG_RATE_LIMITS={}):
+        user = User.objects.create_user(username='bench', password='bench')
+        article = Article.objects.create(title='hot', content='hot', author=user)
+        Comment.objects.bulk_create([Comment(article=article, content='c' * 50, author=user) for _ in range(100)])
+
+        client = Client()
+        client.force_login(user)
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            poll_seconds = common.best_of(POLLS, lambda: client.get('/api/article/%d/comment' % article.id).content)
+
+        async def watch(started, latencies):
+            subscription = live.subscribe(article.id, asyncio.get_running_loop())
+            started.release()
+            received = 0
+            async for frame in live.astream(subscription, [], keepalive=3600):
+                if frame.startswith(b'id:'):
+                    data = json.loads(frame.split(b'data: ', 1)[1])
+                    latencies.append(time.perf_counter() - float(data['content']))
+                    received += 1
+                    if received == args.comments:
+                        return True
+            return False
+
+        async def run():
+            latencies = []
+            started = asyncio.Semaphore(0)
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            tasks = [asyncio.create_task(watch(started, latencies)) for _ in range(args.watchers)]
+            for _ in range(args.watchers):
+                await started.acquire()
+            # Let every task reach its first wait
+            await asyncio.sleep(0.1)
+            memory = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+            tracemalloc.stop()
+
+            await asyncio.sleep(args.idle)
+
+            start = time.perf_counter()
+            for _ in range(args.comments):
+                await Comment.objects.acreate(article_id=article.id, content=repr(time.perf_counter()), author_id=user.id)
+                await asyncio.sleep(0)
+            completed = await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+            return memory, latencies, completed, elapsed
+
+        memory, latencies, completed, elapsed = asyncio.run(run())
+
+    latencies.sort()
+    print(json.dumps({
+        'watchers': args.watchers,
+        'comments': args.comments,
+        'bytes_per_idle_watcher': round(memory / args.watchers),
+        'delivery_ms': {
+            'p50': round(latencies[len(latencies) // 2] * 1000, 2),
+            'p99': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        },
+        'dropped_watchers': completed.count(False),
+        'deliveries_per_second': round(len(latencies) / elapsed),
+        'polling': {
+            'queries_per_poll': timer.queries / POLLS,
+            'queries_per_second': round(args.watchers / args.poll_interval * timer.queries / POLLS),
+            'server_seconds_per_second': round(args.watchers / args.poll_interval * poll_seconds, 2),
+        },
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Shared setup for the scripts in this directory.
+
+Run them from the django/ directory, e.g. ``python -m benchmarks.serialization``.
+Each script works on a throwaway test database, never on db.sqlite3.
+"""
+from contextlib import contextmanager
+import os
+import time
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myblog.settings')
+    django.setup()
+
+@contextmanager
+def test_database():
+    from django.db import connection
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+def best_of(repeat, func):
+    # Minimum wall time in seconds; the least noisy estimate for short runs
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,83 @@
+"""Comment POST throughput with one commit per request vs blog.group_commit.
+
+Each writer is a thread calling the comment view through RequestFactory
+against a fresh SQLite file, as WSGI worker threads would. Reports
+comments per second and failed writes for each writer count and mode.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--writes', type=int, default=5, help='comments per writer')
+    parser.add_argument('--profile', default='tuned')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['MYBLOG_DB_NAME'] = os.path.join(workdir, 'group_commit.sqlite3')
+    os.environ['MYBLOG_DB_PROFILE'] = args.profile
+    try:
+        common.setup()
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test import RequestFactory, override_settings
+        from blog import views
+        from blog.models import Article
+
+        call_command('migrate', verbosity=0)
+        user = User.objects.create_user(username='bench', password='bench')
+        article = Article.objects.create(title='hot', content='hot', author=user)
+        connection.close()
+        factory = RequestFactory()
+
+        def writer(barrier, results):
+            barrier.wait()
+            ok = failed = 0
+            for _ in range(args.writes):
+                request = factory.post('/api/article/%d/comment' % article.id, json.dumps({'content': 'c' * 50}), content_type='application/json')
+                request.user = user
+                try:
+                    ok += views.comment(request, article.id).status_code == 201
+                except Exception:
+                    failed += 1
+            connection.close()
+            results.append((ok, failed))
+
+        report = {'profile': args.profile, 'writes_per_writer': args.writes, 'runs': []}
+        for group in (False, True):
+            for writers in args.writers:
+                results = []
+                barrier = threading.Barrier(writers + 1)
+                threads = [threading.Thread(target=writer, args=(barrier, results)) for _ in range(writers)]
+                for thread in threads:
+                    thread.start()
+                with override_settings(BLOG_COMMENT_GROUP_COMMIT=group):
+                    barrier.wait()
+                    start = time.perf_counter()
+                    for thread in threads:
+                        thread.join()
+                    elapsed = time.perf_counter() - start
+                ok = sum(result[0] for result in results)
+                report['runs'].append({
+                    'mode': 'group_commit' if group else 'per_request',
+                    'writers': writers,
+                    'comments_per_second': round(ok / elapsed, 1),
+                    'failed': sum(result[1] for result in results),
+                })
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Per-request overhead of blog.metrics.MetricsMiddleware over a no-op view."""
+import argparse
+import json
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.urls import resolve
+    from blog.metrics import MetricsMiddleware
+
+    request = RequestFactory().get('/api/article/1')
+    request.resolver_match = resolve('/api/article/1')
+    response = HttpResponse(b'{"title":"t"}')
+
+    def view(request):
+        return response
+
+    middleware = MetricsMiddleware(view)
+
+    def bare():
+        for _ in range(args.requests):
+            view(request)
+
+    def instrumented():
+        for _ in range(args.requests):
+            middleware(request)
+
+    base = common.best_of(args.repeat, bare)
+    measured = common.best_of(args.repeat, instrumented)
+    print(json.dumps({
+        'requests': args.requests,
+        'overhead_us_per_request': round((measured - base) / args.requests * 1e6, 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Bytes and latency of the list views with and without fields= / content_max=."""
+import argparse
+import json
+import os
+
+from benchmarks import common
+
+ARTICLE_VARIANTS = [
+    ('full', {}),
+    ('content_max=200', {'content_max': '200'}),
+    ('fields=title,author', {'fields': 'title,author'}),
+]
+
+COMMENT_VARIANTS = [
+    ('full', {}),
+    ('content_max=50', {'content_max': '50'}),
+    ('fields=article,author', {'fields': 'article,author'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--articles', type=int, default=5000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from blog.models import Article
+
+    setup_test_environment()
+    with common.test_database(), override_settings(BLOG_RATE_LIMITS={}):
+        call_command('seed_blog', users=50, articles=args.articles, comments=args.comments, stdout=open(os.devnull, 'w'))
+        client = Client()
+        client.force_login(User.objects.get(username='seed0'))
+        hot = Article.objects.order_by('-comment_count').values_list('id', flat=True).first()
+        endpoints = {
+            'article_list': ('/api/article', {'limit': str(args.limit)}, ARTICLE_VARIANTS),
+            # The full comment list is served from blog.caching; partial ones always hit the database
+            'comment_list': ('/api/article/%d/comment' % hot, {}, COMMENT_VARIANTS),
+        }
+        report = {'articles': args.articles, 'comments': args.comments, 'limit': args.limit}
+        for name, (path, base, variants) in endpoints.items():
+            report[name] = {}
+            for variant, params in variants:
+                query = dict(base, **params)
+                size = len(client.get(path, query).content)
+                seconds = common.best_of(args.repeat, lambda: client.get(path, query))
+                report[name][variant] = {'bytes': size, 'ms': round(seconds * 1000, 2)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Read-your-writes on SQLite file replicas with a lagging sync.
+
+Sets up a primary and MYBLOG_REPLICAS copies in a temporary directory.
+One client writes an article while manage.py sync_replicas runs with
+--interval/--lag in the background. The script reports when the writer
+sees its article (it is pinned to the primary) and when another client
+reading from a replica first sees it.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import common
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--replicas', type=int, default=2)
+    parser.add_argument('--interval', type=float, default=0.5)
+    parser.add_argument('--lag', type=float, default=1.0)
+    parser.add_argument('--timeout', type=float, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['MYBLOG_DB_NAME'] = os.path.join(workdir, 'primary.sqlite3')
+    os.environ['MYBLOG_REPLICAS'] = str(args.replicas)
+    sync = None
+    try:
+        common.setup()
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.test import Client
+        from django.test.utils import override_settings, setup_test_environment
+
+        setup_test_environment()
+        call_command('migrate', verbosity=0)
+        call_command('sync_replicas', stdout=open(os.devnull, 'w'))
+        writer, reader = Client(), Client()
+        writer.force_login(User.objects.create_user(username='writer', password='writer'))
+        reader.force_login(User.objects.create_user(username='reader', password='reader'))
+        sync = subprocess.Popen(
+            [sys.executable, 'manage.py', 'sync_replicas', '--interval', str(args.interval), '--lag', str(args.lag)],
+            cwd=BASE_DIR, stdout=subprocess.DEVNULL,
+        )
+
+        def titles(client):
+            return [article['title'] for article in json.loads(client.get('/api/article').content)]
+
+        with override_settings(BLOG_RATE_LIMITS={}):
+            start = time.perf_counter()
+            writer.post('/api/article', json.dumps({'title': 'fresh', 'content': 'c'}), content_type='application/json')
+            report = {'replicas': args.replicas, 'interval': args.interval, 'lag': args.lag}
+            report['writer_sees_own_write'] = 'fresh' in titles(writer)
+            report['reader_sees_write_at_once'] = 'fresh' in titles(reader)
+            while 'fresh' not in titles(reader) and time.perf_counter() - start < args.timeout:
+                time.sleep(0.05)
+            report['reader_staleness_seconds'] = round(time.perf_counter() - start, 2)
+        print(json.dumps(report, indent=2))
+    finally:
+        if sync is not None:
+            sync.terminate()
+            sync.wait()
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Time ranked FTS5 article search on a seeded table (default 1M articles)."""
+import argparse
+import json
+import random
+import time
+
+from benchmarks import common
+
+VOCABULARY = ['w%d' % rank for rank in range(50000)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--articles', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from django.utils import timezone
+    from blog import queries
+
+    rng = random.Random(args.seed)
+    # Zipf-distributed words: a few very common terms and a long tail, as in real text
+    cum_weights = []
+    total = 0.0
+    for rank in range(len(VOCABULARY)):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+
+    def words(count):
+        return ' '.join(rng.choices(VOCABULARY, cum_weights=cum_weights, k=count))
+
+    with common.test_database() as connection:
+        user = User.objects.create_user(username='bench', password='bench')
+        now = timezone.now()
+        start = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            for offset in range(0, args.articles, 10000):
+                rows = []
+                for _ in range(min(10000, args.articles - offset)):
+                    title = words(6)
+                    content = words(rng.randint(20, 200))
+                    rows.append((title, content, user.id, now, 0, now, 0))
+                cursor.executemany(
+                    'INSERT INTO blog_article (title, content, author_id, updated_at, comment_version, comment_updated_at, comment_count)'
+                    ' VALUES (%s, %s, %s, %s, %s, %s, %s)', rows)
+        seed_seconds = time.perf_counter() - start
+
+        # Common terms match a large share of the table, rare ones a handful of rows
+        samples = {
+            'common': lambda: ' '.join(rng.sample(VOCABULARY[:20], 2)),
+            'medium': lambda: rng.choice(VOCABULARY[100:1000]),
+            'rare': lambda: rng.choice(VOCABULARY[10000:]),
+        }
+        report = {'articles': args.articles, 'seed_seconds': round(seed_seconds, 1)}
+        for name, sample in samples.items():
+            timings = []
+            for _ in range(args.queries):
+                q = sample()
+                start = time.perf_counter()
+                queries.search_articles(q, 20, 0)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            report[name] = {
+                'p50_ms': round(timings[len(timings) // 2], 3),
+                'p95_ms': round(timings[int(len(timings) * 0.95)], 3),
+                'max_ms': round(timings[-1], 3),
+            }
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
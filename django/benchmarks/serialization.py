@@ -0,0 +1,49 @@
+"""Compare model_to_dict + JsonResponse against blog.serialization on 10k rows."""
+import argparse
+import json
+
+from benchmarks import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.contrib.auth.models import User
+    from django.forms.models import model_to_dict
+    from django.http import JsonResponse
+    from blog import queries, serialization
+    from blog.models import Article, Comment
+
+    with common.test_database():
+        user = User.objects.create_user(username='bench', password='bench')
+        article = Article.objects.create(title='bench', content='bench', author=user)
+        Comment.objects.bulk_create(
+            [Comment(article=article, content='comment %d ' % i * 8, author=user) for i in range(args.rows)],
+            batch_size=500,
+        )
+
+        def old_path():
+            comments = [model_to_dict(comment, fields={'article', 'content', 'author'}) for comment in Comment.objects.all()]
+            return JsonResponse(comments, safe=False).content
+
+        def new_path():
+            rows = serialization.row_dicts(queries.COMMENT_FIELDS, queries.comment_list(article.id))
+            return serialization.json_response(rows).content
+
+        old = common.best_of(args.repeat, old_path)
+        new = common.best_of(args.repeat, new_path)
+        print(json.dumps({
+            'rows': args.rows,
+            'encoder': serialization.dumps.__name__,
+            'model_to_dict_ms': round(old * 1000, 2),
+            'values_list_ms': round(new * 1000, 2),
+            'speedup': round(old / new, 2),
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+"""Settings for the servers benchmarks/asgi_vs_wsgi.py starts: myblog.settings without rate limits."""
+from myblog.settings import *  # noqa: F401,F403
+
+BLOG_RATE_LIMITS = {}
@@ -0,0 +1,99 @@
+"""Hammer the article and comment write views from several processes at once.
+
+Runs against a fresh SQLite file under the chosen database profile (see
+DATABASE_PROFILES in myblog/settings.py) and reports how many writes failed
+with "database is locked". Used by blog.tests.SQLiteConcurrencyTestCase.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup():
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myblog.settings')
+    import django
+    django.setup()
+
+def worker(writes, article_id):
+    setup()
+    from django.contrib.auth.models import User
+    from django.db import OperationalError
+    from django.test import RequestFactory
+    from blog import views
+
+    user = User.objects.get(username='hammer')
+    factory = RequestFactory()
+    result = {'ok': 0, 'lock_errors': 0, 'failures': 0}
+    for i in range(writes):
+        if i % 2:
+            request = factory.post('/api/article', json.dumps({'title': 't', 'content': 'c' * 200}), content_type='application/json')
+            view, args = views.article, ()
+        else:
+            request = factory.post('/api/article/%d/comment' % article_id, json.dumps({'content': 'c' * 50}), content_type='application/json')
+            view, args = views.comment, (article_id,)
+        request.user = user
+        try:
+            response = view(request, *args)
+        except OperationalError as error:
+            result['lock_errors' if 'locked' in str(error) else 'failures'] += 1
+            continue
+        result['ok' if response.status_code == 201 else 'failures'] += 1
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--profile', default='tuned')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['MYBLOG_DB_NAME'] = os.path.join(workdir, 'hammer.sqlite3')
+    os.environ['MYBLOG_DB_PROFILE'] = args.profile
+    try:
+        setup()
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.db import connections
+        from blog.models import Article, Comment
+
+        call_command('migrate', verbosity=0)
+        user = User.objects.create_user(username='hammer', password='hammer')
+        article = Article.objects.create(title='hammer', content='hammer', author=user)
+        connections.close_all()
+
+        context = multiprocessing.get_context('spawn')
+        start = time.perf_counter()
+        with context.Pool(args.processes) as pool:
+            results = pool.starmap(worker, [(args.writes, article.id)] * args.processes)
+        elapsed = time.perf_counter() - start
+
+        total = {key: sum(result[key] for result in results) for key in ('ok', 'lock_errors', 'failures')}
+        # Retries must never have written a row twice
+        total.update({
+            'articles': Article.objects.count(),
+            'comments': Comment.objects.count(),
+            'comment_count': Article.objects.get(id=article.id).comment_count,
+        })
+        total.update({
+            'profile': args.profile,
+            'processes': args.processes,
+            'seconds': round(elapsed, 2),
+            'writes_per_second': round(total['ok'] / elapsed, 1),
+        })
+        print(json.dumps(total))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+from django.urls import path
+from blog import async_views
+from blog.urls import urlpatterns as sync_urlpatterns
+
+# Same routes and names as blog.urls, with the async variants swapped in
+# where they exist, so the two URLconfs can never drift apart.
+ASYNC_VIEWS = {
+    'article': async_views.article,
+    'article_detail': async_views.article_detail,
+    'comment': async_views.comment,
+    'comment_detail': async_views.comment_detail,
+    'comment_stream': async_views.comment_stream,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from asgiref.sync import sync_to_async
+from .models import Comment, Article
+from . import queries, caching, deletion, group_commit, live, payloads, serialization
+from .views import make_etag, timestamp, with_validators, article_list_response, list_projection
+from .views import article_list_options, astream_article_list
+from .views import STREAM_CATCH_UP_MAX, busy_response, last_event_id, event_stream_response
+import asyncio
+
+# Async counterparts of the article and comment views in blog.views, served
+# by myblog.asgi. Database access goes through the async ORM so the event
+# loop is never blocked on a plain list, detail, stream or write; the less
+# common list options reuse the sync builder in a worker thread.
+
+
+async def adenied_status(queryset):
+    return 403 if await queryset.aexists() else 404
+
+
+async def article(request):
+    user = await request.auser()
+    if request.method == 'GET':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        with_comments = 'comment_count' in request.GET or 'recent_comments' in request.GET
+        validator = await queries.aarticle_list_validator(with_comments)
+        etag = make_etag('articles', sorted(validator.items()), request.GET.urlencode())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        stream = request.GET.get('stream')
+        if stream is not None:
+            options = article_list_options(request)
+            if options is None:
+                response = HttpResponseBadRequest()
+            else:
+                _, _, _, stream, fields, content_max = options
+                response = astream_article_list(stream, fields, content_max)
+        elif request.GET:
+            response = await sync_to_async(article_list_response)(request)
+        else:
+            article_list = serialization.row_dicts(queries.ARTICLE_FIELDS, [row async for row in queries.article_list()])
+            response = serialization.json_response(article_list)
+        return with_validators(response, etag, None)
+    elif request.method == 'POST':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        try:
+            title, content = payloads.parse(request, 'title', 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        await Article.objects.acreate(title=title, content=content, author=user)
+        return HttpResponse(status=201)
+    else:
+        return HttpResponseNotAllowed(['GET', 'POST'])
+
+
+async def article_detail(request, article_id):
+    user = await request.auser()
+    if request.method == 'GET':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        article = await caching.aarticle(article_id)
+        if article is None:
+            return HttpResponse(status=404)
+        return serialization.json_response(article)
+    elif request.method == 'PUT':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        try:
+            title, content = payloads.parse(request, 'title', 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        updated = await queries.owned_article(article_id, user.id).aupdate(title=title, content=content, updated_at=timezone.now())
+        if not updated:
+            return HttpResponse(status=await adenied_status(queries.article_by_id(article_id)))
+        caching.article_changed(article_id)
+        return HttpResponse(status=200)
+    elif request.method == 'DELETE':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        comment_count = await queries.owned_article(article_id, user.id).values_list('comment_count', flat=True).afirst()
+        if comment_count is None:
+            return HttpResponse(status=await adenied_status(queries.article_by_id(article_id)))
+        if comment_count < getattr(settings, 'BLOG_DELETE_BACKGROUND_COMMENTS', 10000):
+            await sync_to_async(deletion.delete_articles)([article_id])
+        elif await sync_to_async(deletion.delete_articles_in_background)([article_id]):
+            return HttpResponse(status=202)
+        return HttpResponse(status=200)
+    else:
+        return HttpResponseNotAllowed(['GET', 'PUT', 'DELETE'])
+
+
+async def comment(request, article_id):
+    user = await request.auser()
+    if request.method == 'GET':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        projection = list_projection(request, queries.COMMENT_FIELDS)
+        if projection is None:
+            return HttpResponseBadRequest()
+        validator = await queries.acomment_list_validator(article_id)
+        if validator is None:
+            return serialization.json_response([])
+        etag = make_etag('comments', article_id, validator['comment_version'], projection)
+        last_modified = validator['comment_updated_at']
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp(last_modified))
+        if not_modified is not None:
+            return not_modified
+        if projection == (queries.COMMENT_FIELDS, None):
+            comment_list = await caching.acomment_list(article_id, validator['comment_version'])
+        else:
+            comment_list = serialization.row_dicts(projection[0], [row async for row in queries.comment_list(article_id, *projection)])
+        return with_validators(serialization.json_response(comment_list), etag, last_modified)
+    elif request.method == 'POST':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        try:
+            (content,) = payloads.parse(request, 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        if not await queries.article_by_id(article_id).aexists():
+            return HttpResponse(status=404)
+        try:
+            if group_commit.enabled():
+                await group_commit.asave(Comment(article_id=article_id, content=content, author=user))
+            else:
+                await sync_to_async(queries.create_comment)(article_id, content, user)
+        except group_commit.QueueTimeout:
+            return busy_response()
+        except IntegrityError:
+            # The article was deleted after the check above; its foreign key fails at commit
+            return HttpResponse(status=404)
+        return HttpResponse(status=201)
+    else:
+        return HttpResponseNotAllowed(['GET', 'POST'])
+
+
+async def comment_stream(request, article_id):
+    # Each watcher is a task parked on an asyncio.Event rather than a worker thread
+    user = await request.auser()
+    if request.method == 'GET':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        after_id = last_event_id(request)
+        if after_id is None:
+            return HttpResponseBadRequest()
+        if not await queries.article_by_id(article_id).aexists():
+            return HttpResponse(status=404)
+        subscription = live.subscribe(article_id, asyncio.get_running_loop())
+        catch_up = live.catch_up([row async for row in queries.comments_after(article_id, after_id, STREAM_CATCH_UP_MAX)]) if after_id else []
+        return event_stream_response(live.astream(subscription, catch_up, getattr(settings, 'BLOG_STREAM_KEEPALIVE', 15)))
+    else:
+        return HttpResponseNotAllowed(['GET'])
+
+
+async def comment_detail(request, comment_id):
+    user = await request.auser()
+    if request.method == 'GET':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        row = await queries.comment_by_id(comment_id).values_list(*queries.COMMENT_FIELDS).afirst()
+        if row is None:
+            return HttpResponse(status=404)
+        return serialization.json_response(serialization.row_dict(queries.COMMENT_FIELDS, row))
+    elif request.method == 'PUT':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        try:
+            (content,) = payloads.parse(request, 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        article_id = await queries.owned_comment(comment_id, user.id).values_list('article_id', flat=True).afirst()
+        if article_id is None:
+            return HttpResponse(status=await adenied_status(queries.comment_by_id(comment_id)))
+        await sync_to_async(queries.update_comment)(comment_id, article_id, content)
+        return HttpResponse(status=200)
+    elif request.method == 'DELETE':
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        deleted, _ = await queries.owned_comment(comment_id, user.id).only('id', 'article_id').adelete()
+        if not deleted:
+            return HttpResponse(status=await adenied_status(queries.comment_by_id(comment_id)))
+        return HttpResponse(status=200)
+    else:
+        return HttpResponseNotAllowed(['GET', 'PUT', 'DELETE'])
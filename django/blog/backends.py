@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+import copy
+import time
+
+# Per-process cache of the User behind request.user. AuthenticationMiddleware
+# resolves the user on every authenticated request; within the TTL this
+# backend answers from memory instead of querying auth_user. Entries are
+# dropped by the User signals in blog.signals, so password changes and
+# deletions take effect immediately in this process.
+
+users = {}
+
+
+def forget_user(user_id):
+    users.pop(user_id, None)
+
+def clear():
+    users.clear()
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        now = time.monotonic()
+        entry = users.get(user_id)
+        if entry is not None and entry[0] > now:
+            # Copy so per-request attribute caches never leak across requests
+            return copy.copy(entry[1])
+        user = super().get_user(user_id)
+        if user is not None:
+            if len(users) >= getattr(settings, 'BLOG_USER_CACHE_SIZE', 10000):
+                users.clear()
+            users[user.pk] = (now + getattr(settings, 'BLOG_USER_CACHE_TTL', 5), user)
+            return copy.copy(user)
+        return None
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.utils import timezone
+from .models import Comment, Article
+from . import queries, caching, deletion, signals, live
+
+# Set-based versions of the article and comment writes. Each call runs in a
+# single transaction and reports one status per item, using the same codes
+# article_detail and comment_detail return for a single row.
+
+BULK_BATCH_SIZE = 500
+
+
+def chunks(items, size=BULK_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def owned_rows(model, ids, *fields):
+    # id__in is chunked to stay under SQLite's bound variable limit
+    rows = {}
+    for chunk in chunks(list(set(ids))):
+        for row in model.objects.filter(id__in=chunk).values_list('id', 'author_id', *fields):
+            rows[row[0]] = row[1:]
+    return rows
+
+def item_status(rows, item_id, user_id):
+    if item_id not in rows:
+        return 404
+    if rows[item_id][0] != user_id:
+        return 403
+    return 200
+
+def results(ids, statuses):
+    return [{'id': item_id, 'status': status} for item_id, status in zip(ids, statuses)]
+
+
+def create_articles(items, author):
+    articles = [Article(title=item['title'], content=item['content'], author=author) for item in items]
+    with transaction.atomic():
+        Article.objects.bulk_create(articles, batch_size=BULK_BATCH_SIZE)
+    for article in articles:
+        # bulk_create sends no post_save; ids may be reused, so drop stale entries
+        caching.article_removed(article.id)
+    return results([article.id for article in articles], [201] * len(articles))
+
+def update_articles(items, user_id):
+    ids = [item['id'] for item in items]
+    now = timezone.now()
+    with transaction.atomic():
+        rows = owned_rows(Article, ids)
+        statuses = [item_status(rows, item_id, user_id) for item_id in ids]
+        articles = {}
+        for item, status in zip(items, statuses):
+            if status == 200:
+                articles[item['id']] = Article(id=item['id'], title=item['title'], content=item['content'], updated_at=now)
+        Article.objects.bulk_update(articles.values(), ['title', 'content', 'updated_at'], batch_size=BULK_BATCH_SIZE)
+    for article_id in articles:
+        caching.article_changed(article_id)
+    return results(ids, statuses)
+
+def delete_articles(ids, user_id):
+    with transaction.atomic():
+        rows = owned_rows(Article, ids)
+        statuses = [item_status(rows, item_id, user_id) for item_id in ids]
+        owned = list(set(item_id for item_id, status in zip(ids, statuses) if status == 200))
+        for chunk in chunks(owned):
+            deletion.delete_articles(chunk)
+    return results(ids, statuses)
+
+def create_comments(article_id, items, author):
+    comments = [Comment(article_id=article_id, content=item['content'], author=author) for item in items]
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments, batch_size=BULK_BATCH_SIZE)
+        queries.bump_comment_versions({article_id: len(comments)})
+    live.comments_created(comments)
+    return results([comment.id for comment in comments], [201] * len(comments))
+
+def update_comments(items, user_id):
+    ids = [item['id'] for item in items]
+    now = timezone.now()
+    with transaction.atomic():
+        rows = owned_rows(Comment, ids, 'article_id')
+        statuses = [item_status(rows, item_id, user_id) for item_id in ids]
+        comments = {}
+        for item, status in zip(items, statuses):
+            if status == 200:
+                comments[item['id']] = Comment(id=item['id'], content=item['content'], updated_at=now)
+        Comment.objects.bulk_update(comments.values(), ['content', 'updated_at'], batch_size=BULK_BATCH_SIZE)
+        article_ids = set(rows[comment_id][1] for comment_id in comments)
+        queries.bump_comment_versions(dict.fromkeys(article_ids, 0))
+    return results(ids, statuses)
+
+def delete_comments(ids, user_id):
+    with transaction.atomic(), signals.deferred_comment_changes():
+        rows = owned_rows(Comment, ids)
+        statuses = [item_status(rows, item_id, user_id) for item_id in ids]
+        owned = list(set(item_id for item_id, status in zip(ids, statuses) if status == 200))
+        for chunk in chunks(owned):
+            # The post_delete receivers only need article_id, so the comment bodies are never read
+            Comment.objects.filter(id__in=chunk).only('id', 'article_id').delete()
+    return results(ids, statuses)
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import caches
+from . import queries, routers, serialization
+
+# Read-through cache for the hot read endpoints. Entries hold the serialized
+# dicts the views return, so a hit needs no database access at all. The
+# backend is whatever CACHES alias BLOG_CACHE_ALIAS names.
+#
+# Comment lists are keyed by the article's comment_version, the same value
+# their ETag is built from. A comment write bumps the version in the
+# database, so every process moves to a new key with no cache delete, and a
+# list can never be served under an ETag it does not belong to. Old
+# versions simply expire.
+#
+# Article entries are keyed by id alone and invalidated with a delete,
+# which only reaches the cache this process uses. With the default
+# per-process LocMemCache and several workers, the other workers keep an
+# edited article until BLOG_CACHE_TIMEOUT. A multi-process deployment should
+# point BLOG_CACHE_ALIAS at a shared backend (memcached, redis) and keep
+# BLOG_CACHE_TIMEOUT short, since a read racing a write can still put the old
+# entry back. A missing article is never cached: it may be created in
+# another process at any moment.
+
+MISSING = object()
+
+stats = {'hits': 0, 'misses': 0}
+
+
+def get_cache():
+    return caches[getattr(settings, 'BLOG_CACHE_ALIAS', 'default')]
+
+def article_key(article_id):
+    return 'blog:article:%s' % article_id
+
+def comment_list_key(article_id, comment_version):
+    return 'blog:comments:%s:%s' % (article_id, comment_version)
+
+def stores(value, versioned):
+    # A lagging replica could put a stale id-keyed entry back right after a write invalidated it.
+    # A versioned key comes from the same replica as its value, so it can never name a stale one.
+    return value is not None and (versioned or not routers.reading_from_replica())
+
+def read_through(key, load, versioned=False):
+    cache = get_cache()
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        stats['hits'] += 1
+        return value
+    stats['misses'] += 1
+    value = load()
+    if stores(value, versioned):
+        cache.set(key, value, getattr(settings, 'BLOG_CACHE_TIMEOUT', 300))
+    return value
+
+
+def load_article(article_id):
+    row = queries.article_row(article_id)
+    return serialization.row_dict(queries.ARTICLE_FIELDS, row) if row is not None else None
+
+def article(article_id):
+    return read_through(article_key(article_id), lambda: load_article(article_id))
+
+def comment_list(article_id, comment_version):
+    return read_through(
+        comment_list_key(article_id, comment_version),
+        lambda: serialization.row_dicts(queries.COMMENT_FIELDS, queries.comment_list(article_id)),
+        versioned=True,
+    )
+
+async def aread_through(key, aload, versioned=False):
+    cache = get_cache()
+    value = await cache.aget(key, MISSING)
+    if value is not MISSING:
+        stats['hits'] += 1
+        return value
+    stats['misses'] += 1
+    value = await aload()
+    if stores(value, versioned):
+        await cache.aset(key, value, getattr(settings, 'BLOG_CACHE_TIMEOUT', 300))
+    return value
+
+async def aload_article(article_id):
+    row = await queries.article_by_id(article_id).values_list(*queries.ARTICLE_FIELDS).afirst()
+    return serialization.row_dict(queries.ARTICLE_FIELDS, row) if row is not None else None
+
+async def aload_comment_list(article_id):
+    return serialization.row_dicts(queries.COMMENT_FIELDS, [row async for row in queries.comment_list(article_id)])
+
+async def aarticle(article_id):
+    return await aread_through(article_key(article_id), lambda: aload_article(article_id))
+
+async def acomment_list(article_id, comment_version):
+    return await aread_through(comment_list_key(article_id, comment_version), lambda: aload_comment_list(article_id), versioned=True)
+
+def article_changed(article_id):
+    get_cache().delete(article_key(article_id))
+
+def article_removed(article_id):
+    get_cache().delete(article_key(article_id))
+
+def clear():
+    get_cache().clear()
+
+def reset_stats():
+    stats['hits'] = 0
+    stats['misses'] = 0
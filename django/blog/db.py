@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+import functools
+import time
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'BLOG_SQLITE_PRAGMAS', {}).items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+
+
+def is_busy(error):
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+class CommitTracker:
+    """Execute wrapper that notes when one of the writes it saw has been committed."""
+    def __init__(self):
+        self.committed = False
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.lstrip()[:7].upper().startswith(('INSERT', 'UPDATE', 'DELETE', 'REPLACE')):
+            # Runs at once under autocommit, after COMMIT inside atomic(), never after a rollback
+            transaction.on_commit(self.mark)
+        return result
+
+    def mark(self):
+        self.committed = True
+
+def retry_on_busy(view):
+    """
+    Re-run a view whose write hit SQLite's lock after the busy timeout ran out.
+
+    Only retries outside an enclosing transaction and only while none of the
+    view's writes has committed, so a retry never repeats a write. Views keep
+    each write unit in one transaction.atomic() so a lock error anywhere in it
+    rolls the whole unit back and leaves it retryable.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        attempts = getattr(settings, 'BLOG_BUSY_RETRIES', 5)
+        backoff = getattr(settings, 'BLOG_BUSY_BACKOFF', 0.05)
+        for attempt in range(attempts):
+            tracker = CommitTracker()
+            try:
+                with connection.execute_wrapper(tracker):
+                    return view(request, *args, **kwargs)
+            except OperationalError as error:
+                if not is_busy(error) or connection.in_atomic_block or tracker.committed or attempt == attempts - 1:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+    return wrapper
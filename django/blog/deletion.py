@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from .models import Article, Comment
+from . import queries, caching, jobs
+
+# Deletes that skip Django's cascade collector. Because Comment has
+# post_delete receivers, the collector would load every comment of an
+# article into memory and send a signal per row. Here comments go in raw
+# DELETE statements instead, and the work those receivers would have done
+# (version bumps, cache invalidation) is done once per article.
+
+DELETE_CHUNK_SIZE = 5000
+
+
+def raw_delete(queryset):
+    # One DELETE statement, no signals and no cascades
+    return queryset._raw_delete(queryset.db)
+
+def delete_articles(article_ids):
+    """Delete articles and all their comments in two statements."""
+    # Like Django's own collector, no savepoint when already inside a transaction
+    with transaction.atomic(savepoint=False):
+        # Articles first: foreign keys are only checked at commit, and the change log then records one delete per article
+        deleted = raw_delete(Article.objects.filter(id__in=article_ids))
+        raw_delete(Comment.objects.filter(article_id__in=article_ids))
+    for article_id in article_ids:
+        caching.article_removed(article_id)
+    return deleted
+
+def drain_comments(article_ids, chunk_size=DELETE_CHUNK_SIZE):
+    # Each chunk commits on its own, so other writers only ever wait for one chunk.
+    # The chunk's version bump goes with it, so counts and cached lists stay right while the article is still readable.
+    total = 0
+    for article_id in article_ids:
+        while True:
+            with transaction.atomic():
+                chunk = Comment.objects.filter(article_id=article_id).values('id')[:chunk_size]
+                deleted = raw_delete(Comment.objects.filter(id__in=chunk))
+                if deleted:
+                    queries.bump_comment_versions({article_id: -deleted})
+            total += deleted
+            if deleted < chunk_size:
+                break
+    return total
+
+def delete_articles_in_background(article_ids):
+    """
+    Queue the delete as a blog.jobs job for run_blog_worker: comments are
+    drained in chunks, then delete_articles removes the articles and
+    anything added in the meantime. The articles stay readable until the
+    last step. With BLOG_DELETE_IN_WORKER off the same chunked delete runs
+    right here instead and False is returned, since only a queued job
+    survives a restart.
+    """
+    if getattr(settings, 'BLOG_DELETE_IN_WORKER', True):
+        jobs.enqueue_on_commit(run_background_delete, list(article_ids))
+        return True
+    run_background_delete(article_ids)
+    return False
+
+def run_background_delete(article_ids):
+    drain_comments(article_ids)
+    return delete_articles(article_ids)
+
+def delete_user(user_id):
+    """Delete a user with their articles and comments without loading those rows."""
+    with transaction.atomic():
+        # The user's comments under other authors' articles still have to be taken off those articles' counts
+        others = (
+            Comment.objects.filter(author_id=user_id).exclude(article__author_id=user_id)
+            .values('article_id').annotate(n=Count('id'))
+        )
+        count_deltas = {row['article_id']: -row['n'] for row in others}
+        article_ids = list(Article.objects.filter(author_id=user_id).values_list('id', flat=True))
+        # Articles first, as in delete_articles, so the change log records them and not every comment under them
+        raw_delete(Article.objects.filter(author_id=user_id))
+        # The article__author_id join matches nothing now; article_id__in is chunked to stay under SQLite's bound variable limit
+        for start in range(0, len(article_ids), 500):
+            raw_delete(Comment.objects.filter(article_id__in=article_ids[start:start + 500]))
+        # What is left is the user's comments under other authors' articles, which are logged one by one
+        raw_delete(Comment.objects.filter(author_id=user_id))
+        queries.bump_comment_versions(count_deltas)
+        # Sessions, permissions and admin log entries still go through the collector
+        deleted, _ = User.objects.filter(id=user_id).delete()
+    for article_id in article_ids:
+        caching.article_removed(article_id)
+    return deleted
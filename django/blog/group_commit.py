@@ -0,0 +1,129 @@
+from collections import Counter
+from concurrent.futures import Future, TimeoutError
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from .models import Comment
+from . import queries, live
+import asyncio
+import queue
+import threading
+import time
+
+# Optional group commit for comment creation (BLOG_COMMENT_GROUP_COMMIT).
+# Request threads hand their unsaved Comment to a per-process writer
+# thread. The writer saves whatever has arrived within
+# BLOG_COMMENT_GROUP_COMMIT_DELAY seconds, up to
+# BLOG_COMMENT_GROUP_COMMIT_SIZE comments, with one bulk_create in one
+# transaction. A burst then pays for one commit and one hold of SQLite's
+# writer lock instead of one per request. Each future resolves only after
+# the commit, so a 201 still means the comment is durable.
+
+
+class QueueTimeout(Exception):
+    """The comment waited BLOG_COMMENT_GROUP_COMMIT_TIMEOUT seconds and was withdrawn unwritten."""
+
+
+class GroupCommitter:
+    def __init__(self, max_items=100, max_delay=0.002):
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, comment):
+        """Queue an unsaved Comment; the returned future resolves to it once committed."""
+        future = Future()
+        self.pending.put((comment, future))
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='blog-group-commit', daemon=True)
+                    self.thread.start()
+        return future
+
+    def next_batch(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_items:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            # Comments whose request gave up waiting are dropped unwritten
+            batch = [(comment, future) for comment, future in self.next_batch() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                write_comments([comment for comment, _ in batch])
+            except IntegrityError:
+                # One bad row (e.g. its article was just deleted) must not fail the others
+                for comment, future in batch:
+                    comment.pk = None
+                    try:
+                        write_comments([comment])
+                    except Exception as error:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(comment)
+                continue
+            except Exception as error:
+                # A lock timeout or a broken connection would only repeat per row; the views retry instead
+                connection.close_if_unusable_or_obsolete()
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for comment, future in batch:
+                future.set_result(comment)
+
+
+def write_comments(comments):
+    count_deltas = Counter(comment.article_id for comment in comments)
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        # bulk_create sends no post_save, so do what blog.signals would have done once per article
+        queries.bump_comment_versions(count_deltas)
+    live.comments_created(comments)
+
+
+committer = None
+
+def get_committer():
+    global committer
+    if committer is None:
+        committer = GroupCommitter(
+            getattr(settings, 'BLOG_COMMENT_GROUP_COMMIT_SIZE', 100),
+            getattr(settings, 'BLOG_COMMENT_GROUP_COMMIT_DELAY', 0.002),
+        )
+    return committer
+
+def enabled():
+    return getattr(settings, 'BLOG_COMMENT_GROUP_COMMIT', False)
+
+def wait_timeout():
+    return getattr(settings, 'BLOG_COMMENT_GROUP_COMMIT_TIMEOUT', 10)
+
+def save(comment):
+    """Save comment through the committer; raises QueueTimeout if it was withdrawn before being written."""
+    future = get_committer().submit(comment)
+    try:
+        return future.result(timeout=wait_timeout())
+    except TimeoutError:
+        if future.cancel():
+            raise QueueTimeout()
+        # Already being written: its outcome is a single bounded write away
+        return future.result()
+
+async def asave(comment):
+    future = get_committer().submit(comment)
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), wait_timeout())
+    except asyncio.TimeoutError:
+        if future.cancel():
+            raise QueueTimeout()
+        return await asyncio.wrap_future(future)
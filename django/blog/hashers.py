@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the work factor taken from BLOG_PBKDF2_ITERATIONS.
+
+    The algorithm name is unchanged, so hashes stay interchangeable with
+    Django's own hasher and are re-encoded on the next login whenever the
+    configured iteration count changes.
+    """
+    @property
+    def iterations(self):
+        return getattr(settings, 'BLOG_PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
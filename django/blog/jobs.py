@@ -0,0 +1,74 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Job
+import traceback
+
+# A job queue in the blog_job table, so deferred work needs no broker.
+# A job names a module-level function by dotted path and carries JSON
+# arguments. manage.py run_blog_worker claims due jobs with a conditional
+# UPDATE and runs them. Finished jobs are deleted. A failing job is retried
+# with exponential backoff until max_attempts, then kept as 'failed' along
+# with its traceback.
+
+
+def task_path(task):
+    return task if isinstance(task, str) else '%s.%s' % (task.__module__, task.__qualname__)
+
+def enqueue(task, *args, max_attempts=3, delay=0):
+    return Job.objects.create(
+        task=task_path(task), args=list(args), max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+def enqueue_on_commit(task, *args, **kwargs):
+    """Enqueue once the current transaction commits, so a rollback never leaves a job behind."""
+    transaction.on_commit(lambda: enqueue(task, *args, **kwargs))
+
+
+def claimable(now):
+    # Due jobs, plus running ones whose worker has been silent past BLOG_JOB_TIMEOUT (it most likely died)
+    stale = now - timedelta(seconds=getattr(settings, 'BLOG_JOB_TIMEOUT', 300))
+    return Job.objects.filter(Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale))
+
+def claim(limit):
+    """Mark up to limit due jobs as running and return their ids."""
+    now = timezone.now()
+    claimed = []
+    for job_id in claimable(now).order_by('run_at').values_list('id', flat=True)[:limit]:
+        # Another worker may have taken it since the SELECT; the conditional UPDATE decides
+        if claimable(now).filter(id=job_id).update(status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1):
+            claimed.append(job_id)
+    return claimed
+
+def run_job(job_id):
+    """Run one claimed job; returns True when it succeeded."""
+    job = Job.objects.filter(id=job_id, status=Job.RUNNING).first()
+    if job is None:
+        return False
+    try:
+        import_string(job.task)(*job.args)
+    except Exception:
+        failed(job, traceback.format_exc())
+        return False
+    Job.objects.filter(id=job.id).delete()
+    return True
+
+def failed(job, error):
+    if job.attempts >= job.max_attempts:
+        Job.objects.filter(id=job.id).update(status=Job.FAILED, last_error=error)
+        return
+    backoff = getattr(settings, 'BLOG_JOB_RETRY_BACKOFF', 1) * 2 ** (job.attempts - 1)
+    Job.objects.filter(id=job.id).update(
+        status=Job.QUEUED, run_at=timezone.now() + timedelta(seconds=backoff), last_error=error,
+    )
+
+def run_pending(limit=100):
+    """Claim and run due jobs in this process; returns how many were run."""
+    job_ids = claim(limit)
+    for job_id in job_ids:
+        run_job(job_id)
+    return len(job_ids)
@@ -0,0 +1,163 @@
+from collections import deque
+from django.conf import settings
+from django.db import transaction
+from . import queries, serialization
+import asyncio
+import threading
+
+# In-process fan-out of new comments to the SSE streams of
+# /api/article/<id>/comment/stream. Each stream holds a Subscription with a
+# bounded queue of encoded events. A publisher never blocks on a subscriber:
+# when a queue is full the subscriber is dropped and its stream ends, and
+# the client reconnects with Last-Event-ID to catch up from the database.
+# Idle subscribers cost a queue and a waiting thread or task, no queries.
+# Only comments created in this process are seen.
+
+
+KEEPALIVE = b': keepalive\n\n'
+
+
+def encode(comment_id, data):
+    # One SSE frame, encoded once and shared by every subscriber
+    return comment_id, b'id: %d\nevent: comment\ndata: %s\n\n' % (comment_id, serialization.dumps(data))
+
+def comment_data(comment):
+    return {'id': comment.id, 'article': comment.article_id, 'content': comment.content, 'author': comment.author_id}
+
+def catch_up(rows):
+    # Events for the (id, *COMMENT_FIELDS) rows a reconnecting client missed
+    return [encode(row[0], dict(zip(('id',) + queries.COMMENT_FIELDS, row))) for row in rows]
+
+
+class Subscription:
+    def __init__(self, article_id, max_pending, loop=None):
+        self.article_id = article_id
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.dropped = False
+        # Async streams are woken through their event loop, sync ones directly
+        self.loop = loop
+        self.ready = asyncio.Event() if loop is not None else threading.Event()
+
+    def push(self, event):
+        if len(self.pending) >= self.max_pending:
+            self.dropped = True
+        else:
+            self.pending.append(event)
+        if self.loop is None:
+            self.ready.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self.ready.set)
+            except RuntimeError:
+                # The loop is gone, and so is the client
+                self.dropped = True
+
+    def take(self):
+        # Clear first: a push racing with the drain then leaves the flag set for the next wait
+        self.ready.clear()
+        events = []
+        while self.pending:
+            events.append(self.pending.popleft())
+        return events
+
+    def wait(self, timeout):
+        return self.ready.wait(timeout)
+
+    async def await_ready(self, timeout):
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class Hub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, article_id, max_pending=100, loop=None):
+        subscription = Subscription(article_id, max_pending, loop)
+        with self.lock:
+            self.subscriptions.setdefault(article_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscriptions.get(subscription.article_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscriptions[subscription.article_id]
+
+    def watching(self, article_id):
+        return article_id in self.subscriptions
+
+    def publish(self, article_id, events):
+        with self.lock:
+            subscribers = list(self.subscriptions.get(article_id, ()))
+        for subscription in subscribers:
+            for event in events:
+                subscription.push(event)
+            if subscription.dropped:
+                self.unsubscribe(subscription)
+
+
+hub = Hub()
+
+def subscribe(article_id, loop=None):
+    return hub.subscribe(article_id, getattr(settings, 'BLOG_STREAM_QUEUE_SIZE', 100), loop)
+
+def comments_created(comments):
+    """Publish new comments to their articles' streams once the transaction commits."""
+    events = {}
+    for comment in comments:
+        # Nothing is encoded for articles nobody is watching
+        if hub.watching(comment.article_id):
+            events.setdefault(comment.article_id, []).append(encode(comment.id, comment_data(comment)))
+
+    def publish():
+        for article_id, article_events in events.items():
+            hub.publish(article_id, article_events)
+
+    if events:
+        transaction.on_commit(publish)
+
+
+def stream(subscription, catch_up, keepalive):
+    """SSE body for a sync view: the catch-up frames, then live ones until the subscriber is dropped."""
+    try:
+        # Sent at once so the client sees the stream open before the first comment
+        yield b'retry: 1000\n\n'
+        for _, frame in catch_up:
+            yield frame
+        # A comment committed between subscribing and the catch-up query arrives twice
+        seen = {comment_id for comment_id, _ in catch_up}
+        while True:
+            for comment_id, frame in subscription.take():
+                if comment_id not in seen:
+                    yield frame
+            if subscription.dropped:
+                return
+            if not subscription.wait(keepalive):
+                yield KEEPALIVE
+    finally:
+        hub.unsubscribe(subscription)
+
+async def astream(subscription, catch_up, keepalive):
+    try:
+        yield b'retry: 1000\n\n'
+        for _, frame in catch_up:
+            yield frame
+        seen = {comment_id for comment_id, _ in catch_up}
+        while True:
+            for comment_id, frame in subscription.take():
+                if comment_id not in seen:
+                    yield frame
+            if subscription.dropped:
+                return
+            if not await subscription.await_ready(keepalive):
+                yield KEEPALIVE
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,18 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from blog.models import Change
+from blog import queries
+
+
+class Command(BaseCommand):
+    help = 'Delete change log entries older than --days; clients behind the cut get 410 and resync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=7)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # The newest entry always stays so GET /api/changes can still tell a stale cursor from a quiet log
+        deleted, _ = Change.objects.filter(created_at__lt=cutoff).exclude(id=queries.latest_change()).delete()
+        self.stdout.write('Deleted %d change log entries' % deleted)
@@ -0,0 +1,17 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from blog import deletion
+
+
+class Command(BaseCommand):
+    help = 'Delete a user with all their articles and comments without loading them into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        user_id = User.objects.filter(username=options['username']).values_list('id', flat=True).first()
+        if user_id is None:
+            raise CommandError('No user named %r' % options['username'])
+        deletion.delete_user(user_id)
+        self.stdout.write('Deleted user %s' % options['username'])
@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Runs in a fresh interpreter under -X importtime: import the WSGI
+# application and the URLconf, which is what a worker does before its
+# first request.
+BOOT_SCRIPT = '''
+import time
+start = time.perf_counter()
+import myblog.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+'''
+
+
+def parse_importtime(stderr, top):
+    # Lines look like "import time:  self [us] | cumulative | package"; returns the total and the heaviest modules by self time
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((int(self_us), name.strip()))
+    total_us = sum(self_us for self_us, _ in modules)
+    modules.sort(reverse=True)
+    return total_us / 1000, [{'module': name, 'ms': round(us / 1000, 1)} for us, name in modules[:top]]
+
+
+class Command(BaseCommand):
+    help = 'Compare worker import time and per-request middleware overhead of the settings profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=['full', 'api'])
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--boots', type=int, default=3, help='cold starts per profile; the fastest is reported')
+        parser.add_argument('--top', type=int, default=5, help='heaviest modules to list')
+        parser.add_argument('--child', action='store_true', help='internal: time requests under the current profile')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.time_requests(options['requests'])))
+            return
+        base_dir = settings.BASE_DIR
+        report = {}
+        for profile in options['profiles']:
+            env = dict(os.environ, MYBLOG_SETTINGS_PROFILE=profile, DJANGO_SETTINGS_MODULE='myblog.settings')
+            boots = []
+            for _ in range(options['boots']):
+                boot = subprocess.run(
+                    [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+                    cwd=base_dir, env=env, capture_output=True, text=True, check=True,
+                )
+                boots.append((float(boot.stdout.strip().splitlines()[-1]), boot.stderr))
+            boot_seconds, stderr = min(boots)
+            import_ms, heaviest = parse_importtime(stderr, options['top'])
+            requests = subprocess.run(
+                [sys.executable, 'manage.py', 'measure_startup', '--child', '--requests', str(options['requests'])],
+                cwd=base_dir, env=env, capture_output=True, text=True, check=True,
+            )
+            report[profile] = dict(
+                {'boot_ms': round(boot_seconds * 1000, 1), 'import_ms': round(import_ms, 1)},
+                **json.loads(requests.stdout.strip().splitlines()[-1]),
+                heaviest_imports=heaviest,
+            )
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def time_requests(self, count):
+        from django.test import Client, RequestFactory
+        from django.test.utils import override_settings, setup_test_environment
+        from blog import views
+
+        setup_test_environment()
+
+        # The token view does no database work, so what is left is the handler and middleware chain
+        client = Client()
+        with override_settings(BLOG_RATE_LIMITS={}):
+            for _ in range(10):
+                assert client.get('/api/token').status_code == 204
+            start = time.perf_counter()
+            for _ in range(count):
+                client.get('/api/token')
+            full = (time.perf_counter() - start) / count
+            start = time.perf_counter()
+            for _ in range(count):
+                views.token(RequestFactory().get('/api/token'))
+            bare = (time.perf_counter() - start) / count
+        return {
+            'installed_apps': len(settings.INSTALLED_APPS),
+            'middleware': len(settings.MIDDLEWARE),
+            'request_us': round(full * 1e6, 1),
+            'middleware_us': round((full - bare) * 1e6, 1),
+        }
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blog import queries
+
+
+class Command(BaseCommand):
+    help = 'Recompute Article.comment_count from the comment table'
+
+    def handle(self, *args, **options):
+        updated = queries.rebuild_comment_counts()
+        self.stdout.write('Rebuilt comment counts for %d articles' % updated)
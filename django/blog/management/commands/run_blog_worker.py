@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from blog import jobs
+import multiprocessing
+import os
+import time
+
+
+def close_connections():
+    # Children must not share the parent's database handles
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run queued blog jobs (see blog.jobs) on a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='0 runs jobs in this process')
+        parser.add_argument('--batch', type=int, default=100)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help='exit once no job is due')
+
+    def handle(self, *args, **options):
+        pool = None
+        if options['processes']:
+            close_connections()
+            pool = multiprocessing.Pool(options['processes'], initializer=close_connections)
+        try:
+            while True:
+                job_ids = jobs.claim(options['batch'])
+                if job_ids:
+                    if pool is None:
+                        succeeded = [jobs.run_job(job_id) for job_id in job_ids]
+                    else:
+                        succeeded = pool.map(jobs.run_job, job_ids)
+                    self.stdout.write('Ran %d jobs, %d failed' % (len(job_ids), succeeded.count(False)))
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
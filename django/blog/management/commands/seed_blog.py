@@ -0,0 +1,65 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.models import Article, Comment
+from blog import queries, caching
+import random
+
+BATCH_SIZE = 1000
+
+WORDS = (
+    'the of and to in is that for it as was with be by on not he this are or his from at which but have an they '
+    'you were her she there would their we him been has when who will more no if out so said what up its about '
+    'into than them can only other new some could time these two may then do first any my now such like our over '
+    'django query index cache article comment server request latency write read table column schema'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Generate users, articles and comments with realistic size distributions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='seed-password')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        def text(words):
+            return ' '.join(rng.choice(WORDS) for _ in range(max(1, words)))
+
+        # One hash for every user keeps seeding fast while sign-in still verifies a real PBKDF2 hash
+        password = make_password(options['password'])
+        with transaction.atomic():
+            first = User.objects.count()
+            User.objects.bulk_create(
+                [User(username='seed%d' % (first + i), password=password) for i in range(options['users'])],
+                batch_size=BATCH_SIZE,
+            )
+            user_ids = list(User.objects.order_by('-id').values_list('id', flat=True)[:options['users']])
+
+            # Titles a few words long, article bodies log-normal around a few hundred words
+            articles = [
+                Article(title=text(rng.randint(2, 12))[:120], content=text(int(rng.lognormvariate(5.5, 0.8))), author_id=rng.choice(user_ids))
+                for _ in range(options['articles'])
+            ]
+            Article.objects.bulk_create(articles, batch_size=BATCH_SIZE)
+            article_ids = list(Article.objects.order_by('-id').values_list('id', flat=True)[:options['articles']])
+
+            # A few popular articles collect most comments; comment bodies are short and skewed
+            weights = [1.0 / (rank + 1) for rank in range(len(article_ids))]
+            comments = []
+            for article_id in rng.choices(article_ids, weights=weights, k=options['comments']) if article_ids else []:
+                comments.append(Comment(article_id=article_id, content=text(int(rng.lognormvariate(3, 0.7))), author_id=rng.choice(user_ids)))
+                if len(comments) == BATCH_SIZE:
+                    Comment.objects.bulk_create(comments)
+                    comments = []
+            Comment.objects.bulk_create(comments)
+            # bulk_create sends no signals, so the denormalized counts are rebuilt in one pass
+            queries.rebuild_comment_counts()
+        caching.clear()
+        self.stdout.write('Seeded %d users, %d articles and %d comments' % (options['users'], options['articles'], options['comments']))
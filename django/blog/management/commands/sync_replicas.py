@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+import sqlite3
+import time
+
+
+class Command(BaseCommand):
+    help = 'Copy the default SQLite database onto the BLOG_REPLICAS files, once or in a loop with simulated lag'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='seconds between copies; 0 copies once')
+        parser.add_argument('--lag', type=float, default=0, help='seconds between taking a snapshot and installing it')
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'BLOG_REPLICAS', [])
+        if not replicas:
+            raise CommandError('No replicas configured; set MYBLOG_REPLICAS')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('sync_replicas only copies SQLite databases')
+        try:
+            while True:
+                self.copy(replicas, options['lag'])
+                self.stdout.write('Synced %d replicas' % len(replicas))
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def copy(self, replicas, lag):
+        # The backup API gives a consistent snapshot even while the primary is being written
+        snapshot = sqlite3.connect(':memory:')
+        try:
+            source = sqlite3.connect(connections['default'].settings_dict['NAME'])
+            try:
+                source.backup(snapshot)
+            finally:
+                source.close()
+            time.sleep(lag)
+            for alias in replicas:
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    snapshot.backup(target)
+                finally:
+                    target.close()
+        finally:
+            snapshot.close()
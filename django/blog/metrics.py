@@ -0,0 +1,207 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextvars import ContextVar
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from . import caching
+import threading
+import time
+
+# Per-endpoint request metrics in fixed memory. Values go into log-linear
+# (HDR-style) histograms: exact below 32, and above that 32 sub-buckets per
+# power of two, i.e. about 3% relative error for any quantile. Every
+# histogram is a flat list of BUCKETS counters no matter how many requests
+# it has seen.
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_SHIFT = 40
+BUCKETS = SUB_BUCKETS + MAX_SHIFT * SUB_BUCKETS
+
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return max(value, 0)
+    shift = min(value.bit_length() - SUB_BUCKET_BITS - 1, MAX_SHIFT - 1)
+    mantissa = min(value >> shift, 2 * SUB_BUCKETS - 1)
+    return SUB_BUCKETS + shift * SUB_BUCKETS + mantissa - SUB_BUCKETS
+
+def bucket_value(index):
+    # Midpoint of the bucket, the value reported for a quantile landing in it
+    if index < SUB_BUCKETS:
+        return index
+    shift, offset = divmod(index - SUB_BUCKETS, SUB_BUCKETS)
+    return ((SUB_BUCKETS + offset) << shift) + (1 << shift) // 2
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+
+    def record(self, value):
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bucket_value(index)
+        return bucket_value(BUCKETS - 1)
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.duration_us = Histogram()
+        self.queries = Histogram()
+        self.query_us = Histogram()
+        self.response_bytes = Histogram()
+
+    def record(self, duration_us, queries, query_us, response_bytes):
+        with self.lock:
+            self.duration_us.record(duration_us)
+            self.queries.record(queries)
+            self.query_us.record(query_us)
+            self.response_bytes.record(response_bytes)
+
+
+endpoints = {}
+endpoints_lock = threading.Lock()
+
+def endpoint(name):
+    metrics = endpoints.get(name)
+    if metrics is None:
+        with endpoints_lock:
+            metrics = endpoints.setdefault(name, EndpointMetrics())
+    return metrics
+
+def reset():
+    with endpoints_lock:
+        endpoints.clear()
+
+
+class QueryTimer:
+    """execute_wrapper callback counting the queries of one request and their time."""
+    def __init__(self):
+        self.queries = 0
+        self.elapsed_ns = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.elapsed_ns += time.perf_counter_ns() - start
+            self.queries += 1
+
+
+# The QueryTimer of the request being served. Every connection carries
+# timed_query permanently, and it reads the timer from the context. Under
+# ASGI the queries run on sync_to_async threads with their own connections,
+# but those threads see the request's context, where an execute_wrapper()
+# entered by the middleware would not be seen.
+current_timer = ContextVar('blog_query_timer', default=None)
+
+def timed_query(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+def install_query_timer(connection):
+    # First in the list, so the pop() of an execute_wrapper() block entered before the connection opened removes its own wrapper
+    if timed_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, timed_query)
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    install_query_timer(connection)
+
+for opened in connections.all(initialized_only=True):
+    install_query_timer(opened)
+
+
+class MetricsMiddleware:
+    """
+    Records wall time, query count, query time and response size per URL name
+    into blog.metrics. Place it first in MIDDLEWARE so the wall time covers the
+    rest of the chain. Works in both modes, so under ASGI the chain stays async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        start = time.perf_counter_ns()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.record(request, response, timer, start)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        start = time.perf_counter_ns()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.record(request, response, timer, start)
+        return response
+
+    def record(self, request, response, timer, start):
+        duration_ns = time.perf_counter_ns() - start
+        match = request.resolver_match
+        name = match.url_name if match is not None and match.url_name else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        endpoint(name).record(duration_ns // 1000, timer.queries, timer.elapsed_ns // 1000, size)
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+SERIES = (
+    ('blog_request_duration_seconds', 'Wall time per request', 'duration_us', 1e-6),
+    ('blog_request_queries', 'Database queries per request', 'queries', 1),
+    ('blog_request_query_seconds', 'Database time per request', 'query_us', 1e-6),
+    ('blog_response_bytes', 'Response body size', 'response_bytes', 1),
+)
+
+def prometheus_text():
+    lines = []
+    with endpoints_lock:
+        snapshot = sorted(endpoints.items())
+    for metric, help_text, attribute, scale in SERIES:
+        lines.append('# HELP %s %s' % (metric, help_text))
+        lines.append('# TYPE %s summary' % metric)
+        for name, metrics in snapshot:
+            with metrics.lock:
+                histogram = getattr(metrics, attribute)
+                values = [(q, histogram.quantile(q)) for q in QUANTILES]
+                total, count = histogram.total, histogram.count
+            for q, value in values:
+                lines.append('%s{view="%s",quantile="%s"} %s' % (metric, name, q, value * scale))
+            lines.append('%s_sum{view="%s"} %s' % (metric, name, total * scale))
+            lines.append('%s_count{view="%s"} %d' % (metric, name, count))
+    lines.append('# HELP blog_cache_requests_total Read-through cache lookups in blog.caching')
+    lines.append('# TYPE blog_cache_requests_total counter')
+    lines.append('blog_cache_requests_total{result="hit"} %d' % caching.stats['hits'])
+    lines.append('blog_cache_requests_total{result="miss"} %d' % caching.stats['misses'])
+    return '\n'.join(lines) + '\n'
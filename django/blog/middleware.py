@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+from . import ratelimit, routers
+import math
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+PINNED_COOKIE = 'blog_primary'
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Token-bucket limits per URL name of blog.urls, with separate read and
+    write budgets. Authenticated requests are keyed by user, anonymous ones
+    by client IP. Over-budget requests get 429 with Retry-After before the
+    view runs. Must come after AuthenticationMiddleware.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match.namespace:
+            # Only the blog API is limited, not admin or other included apps
+            return None
+        limits = getattr(settings, 'BLOG_RATE_LIMITS', {})
+        kind = 'read' if request.method in SAFE_METHODS else 'write'
+        budget = limits.get(match.url_name, {}).get(kind) or limits.get('default', {}).get(kind)
+        if budget is None:
+            return None
+        if request.user.is_authenticated:
+            identity = 'user:%s' % request.user.pk
+        else:
+            identity = 'ip:%s' % request.META.get('REMOTE_ADDR')
+        retry_after = ratelimit.take('%s:%s:%s' % (identity, match.url_name, kind), *budget)
+        if retry_after:
+            response = HttpResponse(status=429)
+            response['Retry-After'] = str(math.ceil(retry_after))
+            return response
+        return None
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """
+    Sends the reads of safe requests to BLOG_REPLICA_VIEWS to one of
+    BLOG_REPLICAS, see blog.routers. A write response sets a cookie that
+    pins the client to the primary for BLOG_REPLICA_STICKY_SECONDS, so
+    clients read their own writes while the replicas catch up.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if (request.method in SAFE_METHODS and not match.namespace and PINNED_COOKIE not in request.COOKIES
+                and match.url_name in getattr(settings, 'BLOG_REPLICA_VIEWS', ())):
+            routers.use_replica(routers.pick_replica())
+        return None
+
+    def process_response(self, request, response):
+        # Also reached when the view raised, once the exception became a response
+        routers.use_replica(None)
+        if request.method not in SAFE_METHODS and getattr(settings, 'BLOG_REPLICAS', []):
+            response.set_cookie(
+                PINNED_COOKIE, '1', max_age=getattr(settings, 'BLOG_REPLICA_STICKY_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
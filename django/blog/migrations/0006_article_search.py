@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# External-content FTS5 index over blog_article, kept in sync by triggers so
+# that queryset update()/delete() and bulk writes are covered as well as save().
+# Note that SQLite table rebuilds (some AlterField operations on Article) drop
+# these triggers; such a migration has to run FORWARD_SQL again.
+
+FORWARD_SQL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS blog_article_fts USING fts5(
+        title, content, content='blog_article', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS blog_article_fts_insert AFTER INSERT ON blog_article BEGIN
+        INSERT INTO blog_article_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_article_fts_delete AFTER DELETE ON blog_article BEGIN
+        INSERT INTO blog_article_fts(blog_article_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_article_fts_update AFTER UPDATE OF title, content ON blog_article BEGIN
+        INSERT INTO blog_article_fts(blog_article_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO blog_article_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    "INSERT INTO blog_article_fts(blog_article_fts) VALUES ('rebuild')",
+]
+
+BACKWARD_SQL = [
+    'DROP TRIGGER IF EXISTS blog_article_fts_update',
+    'DROP TRIGGER IF EXISTS blog_article_fts_delete',
+    'DROP TRIGGER IF EXISTS blog_article_fts_insert',
+    'DROP TABLE IF EXISTS blog_article_fts',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_comment_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD_SQL), run_sqlite(BACKWARD_SQL)),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# blog_change is filled by triggers, like the FTS index in 0006, so that
+# queryset update(), bulk_create and the raw deletes in blog.deletion are
+# logged as well as save() and delete(). Article updates are logged only for
+# the columns clients mirror, not for the comment_version/comment_count
+# bumps. A comment deleted after its article (blog.deletion removes the
+# article first) is not logged, since the article's delete already implies
+# it. SQLite table rebuilds of blog_article or blog_comment drop these
+# triggers; such a migration has to run FORWARD_SQL again.
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+FORWARD_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS blog_change_article_insert AFTER INSERT ON blog_article BEGIN
+        INSERT INTO blog_change (model, object_id, article_id, action, created_at) VALUES ('article', new.id, new.id, 'upsert', %(now)s);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_change_article_update AFTER UPDATE OF title, content, author_id ON blog_article BEGIN
+        INSERT INTO blog_change (model, object_id, article_id, action, created_at) VALUES ('article', new.id, new.id, 'upsert', %(now)s);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_change_article_delete AFTER DELETE ON blog_article BEGIN
+        INSERT INTO blog_change (model, object_id, article_id, action, created_at) VALUES ('article', old.id, old.id, 'delete', %(now)s);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_change_comment_insert AFTER INSERT ON blog_comment BEGIN
+        INSERT INTO blog_change (model, object_id, article_id, action, created_at) VALUES ('comment', new.id, new.article_id, 'upsert', %(now)s);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_change_comment_update AFTER UPDATE OF article_id, content, author_id ON blog_comment BEGIN
+        INSERT INTO blog_change (model, object_id, article_id, action, created_at) VALUES ('comment', new.id, new.article_id, 'upsert', %(now)s);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blog_change_comment_delete AFTER DELETE ON blog_comment
+    WHEN EXISTS (SELECT 1 FROM blog_article WHERE id = old.article_id) BEGIN
+        INSERT INTO blog_change (model, object_id, article_id, action, created_at) VALUES ('comment', old.id, old.article_id, 'delete', %(now)s);
+    END""",
+]
+FORWARD_SQL = [statement % {'now': NOW} for statement in FORWARD_SQL]
+
+BACKWARD_SQL = [
+    'DROP TRIGGER IF EXISTS blog_change_comment_delete',
+    'DROP TRIGGER IF EXISTS blog_change_comment_update',
+    'DROP TRIGGER IF EXISTS blog_change_comment_insert',
+    'DROP TRIGGER IF EXISTS blog_change_article_delete',
+    'DROP TRIGGER IF EXISTS blog_change_article_update',
+    'DROP TRIGGER IF EXISTS blog_change_article_insert',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('article_id', models.IntegerField()),
+                ('action', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(run_sqlite(FORWARD_SQL), run_sqlite(BACKWARD_SQL)),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Article(models.Model):
@@ -8,6 +9,17 @@ class Article(models.Model):
             User,
             on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Bumped whenever a comment under this article is created, edited or deleted
+    comment_version = models.PositiveIntegerField(default=0)
+    comment_updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Denormalized; kept in step by blog.signals, rebuilt by manage.py rebuild_comment_counts
+    comment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'id'], name='blog_article_author_id_idx'),
+        ]
 
 class Comment(models.Model):
     article = models.ForeignKey(
@@ -19,3 +31,41 @@ class Comment(models.Model):
             User,
             on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['article', 'id'], name='blog_comment_article_id_idx'),
+        ]
+
+class Job(models.Model):
+    # Deferred work for manage.py run_blog_worker, see blog.jobs
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    status = models.CharField(max_length=10, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='blog_job_status_run_at_idx'),
+        ]
+
+class Change(models.Model):
+    # Append-only log behind GET /api/changes; the id is the sequence number.
+    # Rows are written by SQLite triggers (migration 0008), not by Django.
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+
+    model = models.CharField(max_length=10)
+    object_id = models.IntegerField()
+    article_id = models.IntegerField()
+    action = models.CharField(max_length=10)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from .models import Article
+from . import serialization
+
+# Parsing and validation of the JSON bodies of the write endpoints. The
+# body is decoded straight from request bytes, and its size is checked
+# against Content-Length before it is read. Every field is checked for
+# type and length, so a bad request gets 400 or 413 before the view does
+# any database work, instead of a KeyError or a DataError turning into 500.
+
+TITLE_MAX_LENGTH = Article._meta.get_field('title').max_length
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
+
+
+class Invalid(Exception):
+    def __init__(self, status=400):
+        super().__init__(status)
+        self.status = status
+
+
+def max_lengths():
+    return {
+        'title': TITLE_MAX_LENGTH,
+        'content': getattr(settings, 'BLOG_MAX_CONTENT_LENGTH', 50000),
+        'username': USERNAME_MAX_LENGTH,
+        # Hashing cost grows with the password, so cap it
+        'password': getattr(settings, 'BLOG_MAX_PASSWORD_LENGTH', 4096),
+    }
+
+def body(request, max_size):
+    """The decoded JSON body; Invalid(413) when larger than max_size bytes, Invalid(400) when not JSON."""
+    try:
+        declared = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        raise Invalid()
+    if declared > max_size:
+        # Refused before a single byte of the body is read
+        raise Invalid(413)
+    data = request.body
+    if len(data) > max_size:
+        raise Invalid(413)
+    try:
+        return serialization.loads(data)
+    except (ValueError, RecursionError):
+        raise Invalid()
+
+def fields(item, keys, lengths):
+    if not isinstance(item, dict):
+        raise Invalid()
+    values = []
+    for key in keys:
+        value = item.get(key)
+        if key == 'id':
+            # bool is an int subclass, and true is no id
+            if type(value) is not int:
+                raise Invalid()
+        elif not isinstance(value, str) or len(value) > lengths[key]:
+            raise Invalid()
+        values.append(value)
+    return values
+
+def parse(request, *keys):
+    """The values of keys from a JSON object body, in order."""
+    return fields(body(request, getattr(settings, 'BLOG_MAX_BODY_SIZE', 1048576)), keys, max_lengths())
+
+def parse_auth(request):
+    username, password = parse(request, 'username', 'password')
+    if not username:
+        raise Invalid()
+    return username, password
+
+def parse_bulk(request, *keys):
+    """A JSON array of objects carrying keys, or of bare ids when no keys are given."""
+    items = body(request, getattr(settings, 'BLOG_MAX_BULK_BODY_SIZE', 2621440))
+    if not isinstance(items, list):
+        raise Invalid()
+    lengths = max_lengths()
+    for item in items:
+        if keys:
+            fields(item, keys, lengths)
+        elif type(item) is not int:
+            raise Invalid()
+    return items
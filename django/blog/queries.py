@@ -0,0 +1,196 @@
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber, Substr
+from django.utils import timezone
+from .models import Comment, Article, Change
+from itertools import islice
+import re
+
+# Every lookup here is ordered by id and filtered on a primary key or on the
+# leading column of a composite index, so SQLite never needs a full table scan
+# or a temporary sort.
+
+ARTICLE_FIELDS = ('title', 'content', 'author')
+COMMENT_FIELDS = ('article', 'content', 'author')
+
+
+def projection(fields, content_max=None):
+    # values_list() arguments for fields; with content_max the database itself cuts content short
+    if content_max is None:
+        return fields
+    return tuple(Substr('content', 1, content_max) if field == 'content' else field for field in fields)
+
+def article_list(fields=ARTICLE_FIELDS, content_max=None):
+    return Article.objects.order_by('id').values_list(*projection(fields, content_max))
+
+def article_rows(fields=ARTICLE_FIELDS, content_max=None):
+    # Tuples of id followed by fields
+    return article_list(('id',) + fields, content_max)
+
+async def aiterate(queryset, chunk_size):
+    # Like queryset.aiterator(), which in Django 5.2 runs a values_list() query on the event loop thread and fails
+    rows = queryset.iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while True:
+        chunk = await next_chunk()
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            return
+
+def article_page(limit, after, fields=ARTICLE_FIELDS, content_max=None):
+    # One extra row tells us whether another page exists
+    names = ('id',) + fields
+    rows = [dict(zip(names, row)) for row in article_rows(fields, content_max).filter(id__gt=after)[:limit + 1]]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]['id']
+    return {'articles': rows, 'next': next_cursor}
+
+def article_list_aggregates(with_comments):
+    # Count catches deletions, the updated_at indexes make each Max a single seek
+    aggregates = {'count': Count('id'), 'last_modified': Max('updated_at')}
+    if with_comments:
+        aggregates['comments_modified'] = Max('comment_updated_at')
+    return aggregates
+
+def article_list_validator(with_comments=False):
+    return Article.objects.aggregate(**article_list_aggregates(with_comments))
+
+async def aarticle_list_validator(with_comments=False):
+    return await Article.objects.aaggregate(**article_list_aggregates(with_comments))
+
+SEARCH_SQL = '''
+    SELECT blog_article.id, blog_article.title, blog_article.content, blog_article.author_id
+    FROM blog_article_fts JOIN blog_article ON blog_article.id = blog_article_fts.rowid
+    WHERE blog_article_fts MATCH %s
+    ORDER BY bm25(blog_article_fts, 10.0, 1.0), blog_article.id
+    LIMIT %s OFFSET %s
+'''
+
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x1f\x7f]')
+
+def search_terms(q):
+    # FTS5 fails on a NUL inside a quoted string ("unterminated string"), so control characters only separate terms
+    return CONTROL_CHARACTERS.sub(' ', q).split()
+
+def match_expression(q):
+    # Quote every term so user input can never be parsed as FTS5 query syntax
+    return ' '.join('"%s"' % term.replace('"', '""') for term in search_terms(q))
+
+def search_articles(q, limit, offset):
+    # bm25 ranking over the FTS5 index from migration 0006; other databases fall back to a plain scan
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(SEARCH_SQL, [match_expression(q), limit + 1, offset])
+            rows = cursor.fetchall()
+    else:
+        condition = Q()
+        for term in search_terms(q):
+            condition &= Q(title__icontains=term) | Q(content__icontains=term)
+        rows = list(Article.objects.filter(condition).order_by('id').values_list('id', *ARTICLE_FIELDS)[offset:offset + limit + 1])
+    next_offset = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_offset = offset + limit
+    return {'articles': [dict(zip(('id',) + ARTICLE_FIELDS, row)) for row in rows], 'next': next_offset}
+
+def article_by_id(article_id):
+    return Article.objects.filter(id=article_id)
+
+def article_row(article_id):
+    return article_by_id(article_id).values_list(*ARTICLE_FIELDS).first()
+
+def owned_article(article_id, author_id):
+    return Article.objects.filter(id=article_id, author_id=author_id)
+
+def articles_by_author(author_id):
+    return Article.objects.filter(author_id=author_id).order_by('id')
+
+def comment_list_validator(article_id):
+    return article_by_id(article_id).values('comment_version', 'comment_updated_at').first()
+
+async def acomment_list_validator(article_id):
+    return await article_by_id(article_id).values('comment_version', 'comment_updated_at').afirst()
+
+def bump_comment_version(article_id, count_delta=0):
+    article_by_id(article_id).update(
+        comment_version=F('comment_version') + 1,
+        comment_count=F('comment_count') + count_delta,
+        comment_updated_at=timezone.now(),
+    )
+
+def create_comment(article_id, content, author):
+    # The INSERT and the count bump from blog.signals commit together or not at all
+    with transaction.atomic():
+        return Comment.objects.create(article_id=article_id, content=content, author=author)
+
+def update_comment(comment_id, article_id, content):
+    with transaction.atomic():
+        comment_by_id(comment_id).update(content=content, updated_at=timezone.now())
+        bump_comment_version(article_id)
+
+def bump_comment_versions(count_deltas):
+    # count_deltas maps article id to the change in its comment count; one UPDATE per distinct delta
+    by_delta = {}
+    for article_id, count_delta in count_deltas.items():
+        by_delta.setdefault(count_delta, []).append(article_id)
+    now = timezone.now()
+    for count_delta, article_ids in by_delta.items():
+        for start in range(0, len(article_ids), 500):
+            Article.objects.filter(id__in=article_ids[start:start + 500]).update(
+                comment_version=F('comment_version') + 1,
+                comment_count=F('comment_count') + count_delta,
+                comment_updated_at=now,
+            )
+
+def comment_list(article_id, fields=COMMENT_FIELDS, content_max=None):
+    return Comment.objects.filter(article_id=article_id).order_by('id').values_list(*projection(fields, content_max))
+
+def recent_comments(article_ids, limit):
+    # Top-N per article in one windowed query per chunk of ids
+    recent = {article_id: [] for article_id in article_ids}
+    for start in range(0, len(article_ids), 500):
+        rows = Comment.objects.filter(article_id__in=article_ids[start:start + 500]).annotate(
+            rank=Window(RowNumber(), partition_by=[F('article_id')], order_by=F('id').desc()),
+        ).filter(rank__lte=limit).order_by('article_id', '-id').values(*COMMENT_FIELDS)
+        for row in rows:
+            recent[row['article']].append(row)
+    return recent
+
+def rebuild_comment_counts():
+    counts = Comment.objects.filter(article=OuterRef('pk')).values('article').annotate(count=Count('id')).values('count')
+    return Article.objects.update(comment_count=Coalesce(Subquery(counts), 0))
+
+def comments_after(article_id, after_id, limit):
+    return Comment.objects.filter(article_id=article_id, id__gt=after_id).order_by('id').values_list('id', *COMMENT_FIELDS)[:limit]
+
+def comment_by_id(comment_id):
+    return Comment.objects.filter(id=comment_id)
+
+def comment_row(comment_id):
+    return comment_by_id(comment_id).values_list(*COMMENT_FIELDS).first()
+
+def owned_comment(comment_id, author_id):
+    return Comment.objects.filter(id=comment_id, author_id=author_id)
+
+def changes_since(since, limit):
+    # A range scan on the primary key, however long the log
+    return Change.objects.filter(id__gt=since).order_by('id').values_list('id', 'model', 'object_id', 'article_id', 'action')[:limit]
+
+def oldest_change():
+    return Change.objects.order_by('id').values_list('id', flat=True).first()
+
+def latest_change():
+    return Change.objects.order_by('-id').values_list('id', flat=True).first()
+
+def rows_by_id(model, fields, ids):
+    # id -> dict of fields, in chunks of 500 ids
+    ids = list(ids)
+    rows = {}
+    for start in range(0, len(ids), 500):
+        for row in model.objects.filter(id__in=ids[start:start + 500]).values_list('id', *fields):
+            rows[row[0]] = dict(zip(fields, row[1:]))
+    return rows
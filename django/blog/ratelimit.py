@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+import threading
+import time
+
+# Token buckets for blog.middleware.RateLimitMiddleware. A bucket holds up to
+# `burst` tokens and refills at `rate` tokens per second; each request takes
+# one. Stores only keep (tokens, timestamp) per key, so a check is O(1).
+
+STRIPES = 16
+
+
+class LocalMemoryStore:
+    """
+    Per-process buckets, split over independently locked stripes so that
+    concurrent threads rarely wait on each other. Each stripe keeps at most
+    max_keys / STRIPES buckets and evicts the least recently used one.
+    """
+    def __init__(self, max_keys=100000):
+        self.max_stripe_keys = max(1, max_keys // STRIPES)
+        self.stripes = [(threading.Lock(), OrderedDict()) for _ in range(STRIPES)]
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        lock, buckets = self.stripes[hash(key) % STRIPES]
+        with lock:
+            tokens, stamp = buckets.pop(key, (burst, now))
+            tokens, retry_after = consume(tokens, stamp, rate, burst, now)
+            buckets[key] = (tokens, now)
+            if len(buckets) > self.max_stripe_keys:
+                buckets.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        for lock, buckets in self.stripes:
+            with lock:
+                buckets.clear()
+
+
+class CacheStore:
+    """
+    Buckets shared between processes through a Django cache alias.
+
+    The read-modify-write is not atomic across processes, so concurrent
+    requests for the same key can occasionally both pass; the limit is
+    approximate by design to keep the check at one get and one set.
+    """
+    def __init__(self, alias=None):
+        self.alias = alias or getattr(settings, 'BLOG_RATE_LIMIT_CACHE', 'default')
+
+    def take(self, key, rate, burst):
+        # Wall clock, since monotonic clocks are not comparable between processes
+        now = time.time()
+        cache = caches[self.alias]
+        tokens, stamp = cache.get('blog:ratelimit:' + key, (burst, now))
+        tokens, retry_after = consume(tokens, stamp, rate, burst, now)
+        # Expire once the bucket would be full again anyway
+        cache.set('blog:ratelimit:' + key, (tokens, now), int(burst / rate) + 1)
+        return retry_after
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+def consume(tokens, stamp, rate, burst, now):
+    # Returns the remaining tokens and 0, or the unchanged tokens and the seconds until one is available
+    tokens = min(burst, tokens + (now - stamp) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+stores = {}
+
+def get_store():
+    path = getattr(settings, 'BLOG_RATE_LIMIT_STORE', 'blog.ratelimit.LocalMemoryStore')
+    if path not in stores:
+        stores[path] = import_string(path)()
+    return stores[path]
+
+def take(key, rate, burst):
+    return get_store().take(key, rate, burst)
@@ -0,0 +1,46 @@
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+import random
+
+# Read-replica routing for the blog models. blog.middleware.ReplicaMiddleware
+# picks a replica alias for a safe request to one of BLOG_REPLICA_VIEWS,
+# and every blog read in that request goes there. Anything else, writes and
+# sessions and users included, stays on the primary, so a login never
+# depends on replica lag.
+
+replica = ContextVar('blog_replica', default=None)
+
+
+def use_replica(alias):
+    replica.set(alias)
+
+def pick_replica():
+    replicas = getattr(settings, 'BLOG_REPLICAS', [])
+    return random.choice(replicas) if replicas else None
+
+def reading_from_replica():
+    return replica.get() is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'blog':
+            return replica.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would write an instance back to the replica it was read from
+        if model._meta.app_label == 'blog':
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are file copies of the primary, see manage.py sync_replicas
+        if db in getattr(settings, 'BLOG_REPLICAS', []):
+            return False
+        return None
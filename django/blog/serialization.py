@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Hot read endpoints skip model instances and model_to_dict entirely: rows
+# come straight from values_list() tuples and are encoded to bytes once.
+
+
+def orjson_dumps(value):
+    return orjson.dumps(value)
+
+def stdlib_dumps(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+def default_dumps():
+    path = getattr(settings, 'BLOG_JSON_ENCODER', None)
+    if path:
+        return import_string(path)
+    return orjson_dumps if orjson is not None else stdlib_dumps
+
+dumps = default_dumps()
+
+def loads(data):
+    # Parses request bytes as they are, without a decode() copy to str
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def row_dict(fields, row):
+    return dict(zip(fields, row))
+
+def row_dicts(fields, rows):
+    return [dict(zip(fields, row)) for row in rows]
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from .models import Comment, Article
+from . import queries, caching, backends, live
+import threading
+
+deferred = threading.local()
+
+
+@contextmanager
+def deferred_comment_changes():
+    # Collects the articles touched by comment signals and bumps each one once on exit
+    deferred.count_deltas = {}
+    try:
+        yield
+        queries.bump_comment_versions(deferred.count_deltas)
+    finally:
+        deferred.count_deltas = None
+
+
+@receiver(post_save, sender=Article)
+def article_saved(sender, instance, created, **kwargs):
+    if created:
+        # Ids can be reused (SQLite without AUTOINCREMENT), so drop anything cached under this one
+        caching.article_removed(instance.id)
+    else:
+        caching.article_changed(instance.id)
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, instance, **kwargs):
+    caching.article_removed(instance.id)
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, signal, created=False, origin=None, **kwargs):
+    if isinstance(origin, Article) or isinstance(origin, QuerySet) and origin.model is Article:
+        # Cascading from the article delete, which already dropped the whole list
+        return
+    count_delta = -1 if signal is post_delete else int(created)
+    count_deltas = getattr(deferred, 'count_deltas', None)
+    if count_deltas is not None:
+        count_deltas[instance.article_id] = count_deltas.get(instance.article_id, 0) + count_delta
+        return
+    queries.bump_comment_version(instance.article_id, count_delta)
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        live.comments_created([instance])
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    backends.forget_user(instance.pk)
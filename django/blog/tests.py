@@ -1,4 +1,7 @@
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from unittest import skipUnless
+from . import caching, queries
 import json
 
 
@@ -113,6 +116,53 @@ class ArticleTestCase(TestCase):
         response = client.delete('/api/article')
         self.assertEqual(response.status_code, 405)
 
+    def test_article_page(self):
+        client = Client()
+        client.post('/api/signin', json.dumps({'username':'jun', 'password':'7942'}), content_type='application/json')
+
+        response = client.get('/api/article?limit=2')
+        self.assertEqual(response.status_code, 200)
+        page = json.loads(response.content.decode())
+        self.assertEqual(['First', 'Second'], [article['title'] for article in page['articles']])
+        self.assertEqual(2, page['next'])
+
+        response = client.get('/api/article?limit=2&after=2')
+        page = json.loads(response.content.decode())
+        self.assertEqual(['Third'], [article['title'] for article in page['articles']])
+        self.assertIsNone(page['next'])
+
+        response = client.get('/api/article?after=1')
+        page = json.loads(response.content.decode())
+        self.assertEqual(2, len(page['articles']))
+
+        response = client.get('/api/article?limit=abc')
+        self.assertEqual(response.status_code, 400)
+
+        response = client.get('/api/article?limit=0')
+        self.assertEqual(response.status_code, 400)
+
+    def test_article_stream(self):
+        client = Client()
+        client.post('/api/signin', json.dumps({'username':'jun', 'password':'7942'}), content_type='application/json')
+
+        response = client.get('/api/article?stream=json')
+        self.assertEqual(response.status_code, 200)
+        article_list = json.loads(b''.join(response.streaming_content).decode())
+        self.assertEqual(['First', 'Second', 'Third'], [article['title'] for article in article_list])
+
+        response = client.get('/api/article?stream=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertEqual('Third', json.loads(lines[2])['title'])
+
+        response = client.get('/api/article?stream=csv')
+        self.assertEqual(response.status_code, 400)
+        response = client.get('/api/article?stream=')
+        self.assertEqual(response.status_code, 400)
+        response = client.get('/api/article?stream=json&recent_comments=2')
+        self.assertEqual(response.status_code, 400)
+
     def test_article_detail(self):
         client = Client()
 
@@ -200,6 +250,9 @@ class CommentTestCase(TestCase):
         response = client.get('/api/article/1/comment')
         self.assertEqual(3, len(json.loads(response.content.decode())))
 
+        response = client.post('/api/article/99/comment', json.dumps({'content':'c5'}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
         response = client.delete('/api/article/1/comment')
         self.assertEqual(response.status_code, 405)
 
@@ -254,3 +307,1494 @@ class CommentTestCase(TestCase):
         
         response = client.put('/api/comment/3', json.dumps({'content':'111'}), content_type='application/json')
         self.assertEqual(response.status_code, 404)
+
+class CommentInsertRaceTestCase(TransactionTestCase):
+    # A real commit is needed: foreign keys are only checked when the transaction commits
+    def setUp(self):
+        from .models import Article
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user(username='swpp', password='iluvswpp')
+        Article.objects.create(title='T', content='C', author=self.user)
+
+    def assertInsertRaces(self, post):
+        from unittest import mock
+        from .models import Article, Comment
+        # The article passes the existence check, then is gone by the INSERT
+        with mock.patch.object(queries, 'article_by_id', lambda article_id: Article.objects.all()):
+            self.assertEqual(404, post().status_code)
+        self.assertEqual(0, Comment.objects.count())
+
+    def test_sync(self):
+        client = Client()
+        client.force_login(self.user)
+        self.assertInsertRaces(lambda: client.post('/api/article/99/comment', {'content': 'c'}, content_type='application/json'))
+        self.assertInsertRaces(lambda: client.post('/api/article/99/comment/bulk', [{'content': 'c'}], content_type='application/json'))
+
+    @override_settings(ROOT_URLCONF='myblog.asgi_urls')
+    def test_async(self):
+        from asgiref.sync import async_to_sync
+        async_to_sync(self.async_client.aforce_login)(self.user)
+        self.assertInsertRaces(lambda: async_to_sync(self.async_client.post)(
+            '/api/article/99/comment', {'content': 'c'}, content_type='application/json'))
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class QueryPlanTestCase(TestCase):
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('SCAN', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        return plan
+
+    def test_query_plans(self):
+        self.assertIndexed(queries.article_by_id(1))
+        self.assertIndexed(queries.article_rows().filter(id__gt=5))
+        self.assertIndexed(queries.comment_by_id(1))
+        self.assertIn('blog_comment_article_id', self.assertIndexed(queries.comment_list(1)))
+        self.assertIn('blog_article_author_id', self.assertIndexed(queries.articles_by_author(1)))
+        self.assertIndexed(queries.changes_since(5, 100))
+
+class NumQueriesTestCase(TestCase):
+    # Sessions (cached_db) and users (blog.backends) resolve from memory once warm, so only the view's own queries count
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        owner = User.objects.create_user(username='swpp', password='iluvswpp')
+        other = User.objects.create_user(username='jun', password='7942')
+        self.article = Article.objects.create(title='First', content='11111', author=owner)
+        self.other_article = Article.objects.create(title='Second', content='22222', author=other)
+        self.comment = Comment.objects.create(article=self.article, content='c1', author=owner)
+        self.other_comment = Comment.objects.create(article=self.other_article, content='c2', author=other)
+        self.client = Client()
+        self.client.force_login(owner)
+        self.client.get('/api/article/%d' % self.article.id)
+        caching.clear()
+
+    def assertRequestQueries(self, num, method, path, data=None, status_code=200):
+        kwargs = {}
+        if data is not None:
+            kwargs = {'data': json.dumps(data), 'content_type': 'application/json'}
+        with self.assertNumQueries(num):
+            response = getattr(self.client, method)(path, **kwargs)
+        self.assertEqual(response.status_code, status_code)
+
+    def test_anonymous(self):
+        self.client.logout()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/article')
+        self.assertEqual(response.status_code, 401)
+
+    def test_article_queries(self):
+        self.assertRequestQueries(2, 'get', '/api/article')
+        self.assertRequestQueries(2, 'get', '/api/article?limit=1')
+        self.assertRequestQueries(1, 'post', '/api/article', {'title': 'T', 'content': 'C'}, 201)
+
+    def test_article_detail_queries(self):
+        path = '/api/article/%d' % self.article.id
+        other_path = '/api/article/%d' % self.other_article.id
+        self.assertRequestQueries(1, 'get', path)
+        self.assertRequestQueries(0, 'get', path)
+        self.assertRequestQueries(1, 'put', path, {'title': 'T', 'content': 'C'})
+        self.assertRequestQueries(2, 'put', other_path, {'title': 'T', 'content': 'C'}, 403)
+        self.assertRequestQueries(2, 'put', '/api/article/999', {'title': 'T', 'content': 'C'}, 404)
+        self.assertRequestQueries(2, 'delete', other_path, status_code=403)
+        self.assertRequestQueries(3, 'delete', path)
+
+    def test_comment_queries(self):
+        path = '/api/article/%d/comment' % self.article.id
+        self.assertRequestQueries(2, 'get', path)
+        self.assertRequestQueries(1, 'get', path)
+        # The insert and the count bump share a transaction, a savepoint pair inside the test's own
+        self.assertRequestQueries(5, 'post', path, {'content': 'c'}, 201)
+        self.assertRequestQueries(1, 'post', '/api/article/999/comment', {'content': 'c'}, 404)
+
+    def test_comment_detail_queries(self):
+        path = '/api/comment/%d' % self.comment.id
+        other_path = '/api/comment/%d' % self.other_comment.id
+        self.assertRequestQueries(1, 'get', path)
+        self.assertRequestQueries(5, 'put', path, {'content': 'C'})
+        self.assertRequestQueries(2, 'put', other_path, {'content': 'C'}, 403)
+        self.assertRequestQueries(2, 'delete', other_path, status_code=403)
+        self.assertRequestQueries(3, 'delete', path)
+
+    def test_writes_never_read_content(self):
+        from django.test.utils import CaptureQueriesContext
+        from .models import Comment
+        extra = Comment.objects.create(article=self.article, content='c3', author_id=self.comment.author_id)
+        with CaptureQueriesContext(connection) as captured:
+            self.client.post('/api/article/%d/comment' % self.article.id, json.dumps({'content': 'c'}), content_type='application/json')
+            self.client.delete('/api/comment/%d' % self.comment.id)
+            response = self.client.delete('/api/comment/bulk', json.dumps([extra.id]), content_type='application/json')
+            self.assertEqual([{'id': extra.id, 'status': 200}], json.loads(response.content))
+            self.client.delete('/api/article/%d' % self.article.id)
+        selects = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertNotIn('"content"', sql)
+
+class CachingTestCase(TestCase):
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.article = Article.objects.create(title='First', content='11111', author=user)
+        Comment.objects.create(article=self.article, content='c1', author=user)
+        self.client = Client()
+        self.client.force_login(user)
+        caching.clear()
+        caching.reset_stats()
+
+    def test_read_through(self):
+        self.assertEqual('First', caching.article(self.article.id)['title'])
+        self.assertEqual('First', caching.article(self.article.id)['title'])
+        self.assertEqual(1, len(caching.comment_list(self.article.id, 1)))
+        self.assertIsNone(caching.article(999))
+        self.assertEqual({'hits': 1, 'misses': 3}, caching.stats)
+
+    def test_missing_article_not_cached(self):
+        from .models import Article
+        self.assertIsNone(caching.article(999))
+        # As another worker process would create it: no post_save here, so nothing is invalidated
+        Article.objects.bulk_create([Article(id=999, title='Later', content='1', author_id=self.article.author_id)])
+        self.assertEqual('Later', caching.article(999)['title'])
+
+    def test_invalidation(self):
+        from .models import Comment
+        path = '/api/article/%d' % self.article.id
+
+        self.client.get(path)
+        self.client.put(path, json.dumps({'title': 'Edited', 'content': '1'}), content_type='application/json')
+        self.assertIn('Edited', self.client.get(path).content.decode())
+
+        self.client.get(path + '/comment')
+        self.client.post(path + '/comment', json.dumps({'content': 'c2'}), content_type='application/json')
+        comment_list = json.loads(self.client.get(path + '/comment').content.decode())
+        self.assertEqual(['c1', 'c2'], [comment['content'] for comment in comment_list])
+
+        comment = Comment.objects.get(content='c1')
+        self.client.put('/api/comment/%d' % comment.id, json.dumps({'content': 'c0'}), content_type='application/json')
+        self.assertIn('c0', self.client.get(path + '/comment').content.decode())
+
+        self.client.delete('/api/comment/%d' % comment.id)
+        self.assertEqual(1, len(json.loads(self.client.get(path + '/comment').content.decode())))
+
+        self.client.delete(path)
+        self.assertEqual(404, self.client.get(path).status_code)
+        self.assertEqual([], json.loads(self.client.get(path + '/comment').content.decode()))
+
+    def test_comment_list_follows_version(self):
+        from .models import Comment
+        path = '/api/article/%d/comment' % self.article.id
+        etag = self.client.get(path)['ETag']
+        # As another worker process would: new rows and a new version, but nothing deleted from this process's cache
+        Comment.objects.filter(article=self.article).update(content='elsewhere')
+        queries.bump_comment_version(self.article.id)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['elsewhere'], [comment['content'] for comment in json.loads(response.content)])
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.article = Article.objects.create(title='First', content='11111', author=user)
+        self.comment = Comment.objects.create(article=self.article, content='c1', author=user)
+        self.client = Client()
+        self.client.force_login(user)
+
+    def assertRevalidates(self, path, change, last_modified=True):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(last_modified, 'Last-Modified' in response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(b'', response.content)
+
+        change()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(etag, response['ETag'])
+        return response['ETag']
+
+    def test_article_list(self):
+        path = '/api/article'
+        etag = self.assertRevalidates(path, lambda: self.client.put(
+            '/api/article/%d' % self.article.id, json.dumps({'title': 'T', 'content': 'C'}), content_type='application/json'), last_modified=False)
+        self.assertNotEqual(etag, self.client.get(path + '?limit=1')['ETag'])
+
+        self.client.post(path, json.dumps({'title': 'T', 'content': 'C'}), content_type='application/json')
+        self.assertEqual(200, self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code)
+
+        # A delete moves no updated_at, so If-Modified-Since alone must not answer 304
+        self.client.delete('/api/article/%d' % self.article.id)
+        self.assertEqual(200, self.client.get(path, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT').status_code)
+
+    def test_comment_list(self):
+        path = '/api/article/%d/comment' % self.article.id
+        etag = self.assertRevalidates(path, lambda: self.client.post(
+            path, json.dumps({'content': 'c2'}), content_type='application/json'))
+        self.client.put('/api/comment/%d' % self.comment.id, json.dumps({'content': 'c0'}), content_type='application/json')
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.client.delete('/api/comment/%d' % self.comment.id)
+        self.assertEqual(200, self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code)
+
+        response = self.client.get('/api/article/999/comment')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+class BulkTestCase(TestCase):
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        other = User.objects.create_user(username='jun', password='7942')
+        self.article = Article.objects.create(title='First', content='11111', author=user)
+        self.other_article = Article.objects.create(title='Second', content='22222', author=other)
+        self.comment = Comment.objects.create(article=self.article, content='c1', author=user)
+        self.other_comment = Comment.objects.create(article=self.article, content='c2', author=other)
+        self.client = Client()
+        self.client.force_login(user)
+
+    def send(self, method, path, data):
+        response = getattr(self.client, method)(path, json.dumps(data), content_type='application/json')
+        return response.status_code, json.loads(response.content.decode()) if response.status_code < 300 else None
+
+    def test_article_bulk(self):
+        from .models import Article
+
+        status, created = self.send('post', '/api/article/bulk', [{'title': 'T%d' % i, 'content': 'C'} for i in range(3)])
+        self.assertEqual(201, status)
+        self.assertEqual([201] * 3, [item['status'] for item in created])
+        self.assertEqual(5, Article.objects.count())
+
+        ids = [self.article.id, self.other_article.id, 999]
+        status, updated = self.send('put', '/api/article/bulk', [{'id': article_id, 'title': 'U', 'content': 'U'} for article_id in ids])
+        self.assertEqual([200, 403, 404], [item['status'] for item in updated])
+        self.assertEqual('U', Article.objects.get(id=self.article.id).title)
+        self.assertEqual('Second', Article.objects.get(id=self.other_article.id).title)
+
+        status, deleted = self.send('delete', '/api/article/bulk', ids + [created[0]['id']])
+        self.assertEqual([200, 403, 404, 200], [item['status'] for item in deleted])
+        self.assertEqual(3, Article.objects.count())
+        self.assertEqual(404, self.client.get('/api/comment/%d' % self.comment.id).status_code)
+
+        self.assertEqual(400, self.send('post', '/api/article/bulk', [{'title': 'T'}])[0])
+        self.assertEqual(400, self.send('put', '/api/article/bulk', {'id': 1})[0])
+        self.assertEqual(400, self.send('delete', '/api/article/bulk', ['x'])[0])
+        self.assertEqual(405, self.client.get('/api/article/bulk').status_code)
+
+    def test_comment_bulk(self):
+        from .models import Article, Comment
+        path = '/api/article/%d/comment' % self.article.id
+        etag = self.client.get(path)['ETag']
+
+        status, created = self.send('post', path + '/bulk', [{'content': 'n%d' % i} for i in range(3)])
+        self.assertEqual(201, status)
+        self.assertEqual(5, len(json.loads(self.client.get(path).content.decode())))
+        self.assertNotEqual(etag, self.client.get(path)['ETag'])
+        self.assertEqual(404, self.send('post', '/api/article/999/comment/bulk', [{'content': 'n'}])[0])
+
+        ids = [self.comment.id, self.other_comment.id, 999]
+        status, updated = self.send('put', '/api/comment/bulk', [{'id': comment_id, 'content': 'u'} for comment_id in ids])
+        self.assertEqual([200, 403, 404], [item['status'] for item in updated])
+        self.assertIn('"u"', self.client.get(path).content.decode())
+
+        version = Article.objects.get(id=self.article.id).comment_version
+        status, deleted = self.send('delete', '/api/comment/bulk', ids + [item['id'] for item in created])
+        self.assertEqual([200, 403, 404, 200, 200, 200], [item['status'] for item in deleted])
+        self.assertEqual(1, Comment.objects.count())
+        self.assertEqual(version + 1, Article.objects.get(id=self.article.id).comment_version)
+        self.assertEqual(1, len(json.loads(self.client.get(path).content.decode())))
+
+        self.assertEqual(400, self.send('put', '/api/comment/bulk', [{'id': 1}])[0])
+        self.assertEqual(400, self.send('delete', '/api/comment/bulk', 'x')[0])
+        self.assertEqual(405, self.client.get('/api/comment/bulk').status_code)
+        self.assertEqual(405, self.client.get(path + '/bulk').status_code)
+
+        self.client.logout()
+        self.assertEqual(401, self.client.get('/api/comment/bulk').status_code)
+
+class CommentCountTestCase(TestCase):
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.articles = [Article.objects.create(title='A%d' % i, content='C', author=user) for i in range(3)]
+        for i in range(4):
+            Comment.objects.create(article=self.articles[0], content='c%d' % i, author=user)
+        Comment.objects.create(article=self.articles[1], content='d', author=user)
+        self.client = Client()
+        self.client.force_login(user)
+
+    def counts(self):
+        from .models import Article
+        return list(Article.objects.order_by('id').values_list('comment_count', flat=True))
+
+    def test_counts_follow_writes(self):
+        from .models import Comment
+        self.assertEqual([4, 1, 0], self.counts())
+
+        path = '/api/article/%d/comment' % self.articles[2].id
+        self.client.post(path, json.dumps({'content': 'x'}), content_type='application/json')
+        self.client.post(path + '/bulk', json.dumps([{'content': 'y'}, {'content': 'z'}]), content_type='application/json')
+        self.assertEqual([4, 1, 3], self.counts())
+
+        first_ids = list(Comment.objects.filter(article=self.articles[0]).values_list('id', flat=True))
+        self.client.delete('/api/comment/%d' % first_ids[0])
+        self.client.delete('/api/comment/bulk', json.dumps(first_ids[1:3]), content_type='application/json')
+        self.assertEqual([1, 1, 3], self.counts())
+
+    def test_insert_and_count_commit_together(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from .models import Comment
+        comment = Comment.objects.filter(article=self.articles[1]).get()
+        # A failing count bump takes the comment write down with it
+        with mock.patch.object(queries, 'bump_comment_version', side_effect=OperationalError('disk I/O error')):
+            with self.assertRaises(OperationalError):
+                self.client.post('/api/article/%d/comment' % self.articles[2].id, json.dumps({'content': 'x'}), content_type='application/json')
+            with self.assertRaises(OperationalError):
+                self.client.put('/api/comment/%d' % comment.id, json.dumps({'content': 'edited'}), content_type='application/json')
+        self.assertFalse(Comment.objects.filter(article=self.articles[2]).exists())
+        self.assertEqual('d', Comment.objects.get(id=comment.id).content)
+        self.assertEqual([4, 1, 0], self.counts())
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import Article
+        Article.objects.update(comment_count=7)
+        out = StringIO()
+        call_command('rebuild_comment_counts', stdout=out)
+        self.assertIn('3 articles', out.getvalue())
+        self.assertEqual([4, 1, 0], self.counts())
+
+    def test_article_list_with_comments(self):
+        # The user is resolved once, then the validator, the rows and the windowed comments
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/article?comment_count=1&recent_comments=2')
+        article_list = json.loads(response.content.decode())
+        self.assertEqual([4, 1, 0], [article['comment_count'] for article in article_list])
+        self.assertEqual(['c3', 'c2'], [comment['content'] for comment in article_list[0]['recent_comments']])
+        self.assertEqual(['d'], [comment['content'] for comment in article_list[1]['recent_comments']])
+        self.assertEqual([], article_list[2]['recent_comments'])
+
+        etag = response['ETag']
+        self.client.post('/api/article/%d/comment' % self.articles[2].id, json.dumps({'content': 'x'}), content_type='application/json')
+        response = self.client.get('/api/article?comment_count=1&recent_comments=2', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        page = json.loads(self.client.get('/api/article?limit=1&comment_count=1&recent_comments=1').content.decode())
+        self.assertEqual(4, page['articles'][0]['comment_count'])
+        self.assertEqual(['c3'], [comment['content'] for comment in page['articles'][0]['recent_comments']])
+
+        self.assertNotIn('comment_count', json.loads(self.client.get('/api/article').content.decode())[0])
+        self.assertEqual(400, self.client.get('/api/article?recent_comments=-1').status_code)
+
+class SerializationTestCase(TestCase):
+    def test_encoders_agree(self):
+        from . import serialization
+        rows = serialization.row_dicts(('title', 'author'), [('a"b', 1), ('é', 2)])
+        self.assertEqual([{'title': 'a"b', 'author': 1}, {'title': 'é', 'author': 2}], rows)
+        self.assertEqual(rows, json.loads(serialization.stdlib_dumps(rows).decode()))
+        self.assertEqual(rows, json.loads(serialization.dumps(rows).decode()))
+
+        response = serialization.json_response(rows, status=201)
+        self.assertEqual(201, response.status_code)
+        self.assertEqual('application/json', response['Content-Type'])
+
+class AuthCacheTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from .models import Article
+        self.user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.path = '/api/article/%d' % Article.objects.create(title='T', content='C', author=self.user).id
+        self.client = Client()
+        self.client.post('/api/signin', json.dumps({'username': 'swpp', 'password': 'iluvswpp'}), content_type='application/json')
+        caching.clear()
+
+    def test_cached_user(self):
+        # One user lookup plus the (then cached) article load
+        with self.assertNumQueries(2):
+            self.client.get(self.path)
+        with self.assertNumQueries(0):
+            self.client.get(self.path)
+
+        self.user.set_password('changed')
+        self.user.save()
+        # The password hash is part of the session check, so the old session is rejected immediately
+        self.assertEqual(401, self.client.get(self.path).status_code)
+
+    def test_expiry(self):
+        from django.test import override_settings
+        with override_settings(BLOG_USER_CACHE_TTL=0):
+            self.client.get(self.path)
+            with self.assertNumQueries(1):
+                self.client.get(self.path)
+
+    def test_configurable_hasher(self):
+        from django.contrib.auth.hashers import check_password
+        from django.test import override_settings
+        from .hashers import ConfigurablePBKDF2PasswordHasher
+        with override_settings(BLOG_PBKDF2_ITERATIONS=1000):
+            hasher = ConfigurablePBKDF2PasswordHasher()
+            encoded = hasher.encode('secret', hasher.salt())
+            self.assertTrue(encoded.startswith('pbkdf2_sha256$1000$'))
+            self.assertTrue(check_password('secret', encoded))
+            self.assertFalse(hasher.must_update(encoded))
+
+    def test_md5_only_in_test_profile(self):
+        from django.conf import global_settings, settings
+        md5 = 'django.contrib.auth.hashers.MD5PasswordHasher'
+        profiles = settings.PASSWORD_HASHER_PROFILES
+        self.assertEqual(global_settings.PASSWORD_HASHERS, profiles['strict'])
+        self.assertNotIn(md5, profiles['fast'])
+        self.assertIn('django.contrib.auth.hashers.Argon2PasswordHasher', profiles['fast'])
+        self.assertEqual(md5, profiles['test'][0])
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        from .models import Article
+        from django.contrib.auth.models import User
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.python = Article.objects.create(title='Python tips', content='generators and iterators', author=user)
+        self.django = Article.objects.create(title='Django ORM', content='querysets are lazy, like python generators', author=user)
+        Article.objects.create(title='Rust', content='ownership', author=user)
+        self.client = Client()
+        self.client.force_login(user)
+
+    def search(self, query):
+        response = self.client.get('/api/article/search', query)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode())
+
+    def test_search(self):
+        from .models import Article
+        result = self.search({'q': 'python'})
+        self.assertEqual([self.python.id, self.django.id], [article['id'] for article in result['articles']])
+
+        result = self.search({'q': 'python generators', 'limit': 1})
+        self.assertEqual(1, len(result['articles']))
+        self.assertEqual(1, result['next'])
+        result = self.search({'q': 'python generators', 'limit': 1, 'offset': 1})
+        self.assertIsNone(result['next'])
+
+        self.assertEqual([], self.search({'q': '"unbalanced AND ('})['articles'])
+
+        # Index follows update() and delete() as well as save()
+        Article.objects.filter(id=self.django.id).update(content='migrations')
+        self.assertEqual([self.python.id], [article['id'] for article in self.search({'q': 'generators'})['articles']])
+        Article.objects.filter(id=self.python.id).delete()
+        self.assertEqual([], self.search({'q': 'generators'})['articles'])
+
+        self.assertEqual(400, self.client.get('/api/article/search').status_code)
+        # FTS5 rejects NUL in a quoted term; control characters only separate terms
+        self.assertEqual(400, self.client.get('/api/article/search', {'q': '\x00'}).status_code)
+        self.assertEqual(400, self.client.get('/api/article/search?q=%00%01').status_code)
+        self.assertEqual(1, len(self.search({'q': 'rust\x00ownership'})['articles']))
+        self.assertEqual(400, self.client.get('/api/article/search', {'q': 'x', 'limit': 'y'}).status_code)
+        self.assertEqual(405, self.client.post('/api/article/search').status_code)
+        self.client.logout()
+        self.assertEqual(401, self.client.get('/api/article/search', {'q': 'x'}).status_code)
+
+@override_settings(ROOT_URLCONF='myblog.asgi_urls')
+class AsyncViewTestCase(TestCase):
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user(username='swpp', password='iluvswpp')
+        other = User.objects.create_user(username='jun', password='7942')
+        self.article = Article.objects.create(title='First', content='11111', author=self.user)
+        self.other_article = Article.objects.create(title='Second', content='22222', author=other)
+        self.comment = Comment.objects.create(article=self.article, content='c1', author=self.user)
+        self.other_comment = Comment.objects.create(article=self.article, content='c2', author=other)
+        caching.clear()
+
+    def test_middleware_stays_async(self):
+        from django.core.handlers.asgi import ASGIHandler
+        # Django logs every sync-only middleware it has to wrap in async_to_sync
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_metrics_and_rate_limits(self):
+        from . import metrics, ratelimit
+        await self.async_client.aforce_login(self.user)
+        metrics.reset()
+        await self.async_client.get('/api/article')
+        self.assertGreaterEqual(metrics.endpoints['article'].queries.total, 2)
+        ratelimit.get_store().clear()
+        with override_settings(BLOG_RATE_LIMITS={'article': {'read': (0.001, 1)}}):
+            self.assertEqual(200, (await self.async_client.get('/api/article')).status_code)
+            self.assertEqual(429, (await self.async_client.get('/api/article')).status_code)
+
+    async def test_anonymous(self):
+        for path in ['/api/article', '/api/article/1', '/api/article/1/comment', '/api/comment/1']:
+            response = await self.async_client.get(path)
+            self.assertEqual(response.status_code, 401)
+
+    async def test_article(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/article')
+        self.assertEqual(['First', 'Second'], [article['title'] for article in json.loads(response.content)])
+        etag = response['ETag']
+        response = await self.async_client.get('/api/article', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get('/api/article', {'limit': 1})
+        self.assertEqual(1, json.loads(response.content)['next'])
+
+        response = await self.async_client.post('/api/article', {'title': 'Third', 'content': '3'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.delete('/api/article')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_article_stream(self):
+        import warnings
+        await self.async_client.aforce_login(self.user)
+        # Django warns when it has to read a sync streaming body into a list under ASGI
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            response = await self.async_client.get('/api/article', {'stream': 'json'})
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content])
+            self.assertEqual(['First', 'Second'], [article['title'] for article in json.loads(body)])
+
+            response = await self.async_client.get('/api/article', {'stream': 'ndjson', 'fields': 'title'})
+            self.assertEqual('application/x-ndjson', response['Content-Type'])
+            lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+            self.assertEqual([{'id': self.other_article.id, 'title': 'Second'}], [json.loads(line) for line in lines[1:]])
+        self.assertEqual(400, (await self.async_client.get('/api/article', {'stream': 'csv'})).status_code)
+        self.assertEqual(400, (await self.async_client.get('/api/article', {'stream': 'json', 'recent_comments': 1})).status_code)
+
+    async def test_article_detail(self):
+        await self.async_client.aforce_login(self.user)
+        path = '/api/article/%d' % self.article.id
+        other_path = '/api/article/%d' % self.other_article.id
+        response = await self.async_client.get(path)
+        self.assertEqual('First', json.loads(response.content)['title'])
+        self.assertEqual(404, (await self.async_client.get('/api/article/999')).status_code)
+
+        data = {'title': 'Edited', 'content': '1'}
+        self.assertEqual(200, (await self.async_client.put(path, data, content_type='application/json')).status_code)
+        self.assertIn('Edited', (await self.async_client.get(path)).content.decode())
+        self.assertEqual(403, (await self.async_client.put(other_path, data, content_type='application/json')).status_code)
+        self.assertEqual(404, (await self.async_client.put('/api/article/999', data, content_type='application/json')).status_code)
+
+        self.assertEqual(403, (await self.async_client.delete(other_path)).status_code)
+        self.assertEqual(200, (await self.async_client.delete(path)).status_code)
+        self.assertEqual(404, (await self.async_client.delete(path)).status_code)
+        self.assertEqual(405, (await self.async_client.post(path)).status_code)
+
+    async def test_comment(self):
+        await self.async_client.aforce_login(self.user)
+        path = '/api/article/%d/comment' % self.article.id
+        response = await self.async_client.get(path)
+        self.assertEqual(['c1', 'c2'], [comment['content'] for comment in json.loads(response.content)])
+        etag = response['ETag']
+
+        response = await self.async_client.post(path, {'content': 'c3'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.get(path, headers={'If-None-Match': etag})
+        self.assertEqual(3, len(json.loads(response.content)))
+        self.assertEqual([], json.loads((await self.async_client.get('/api/article/999/comment')).content))
+        self.assertEqual(404, (await self.async_client.post('/api/article/999/comment', {'content': 'c4'}, content_type='application/json')).status_code)
+        self.assertEqual(405, (await self.async_client.put(path)).status_code)
+
+    async def test_comment_detail(self):
+        await self.async_client.aforce_login(self.user)
+        path = '/api/comment/%d' % self.comment.id
+        other_path = '/api/comment/%d' % self.other_comment.id
+        self.assertEqual('c1', json.loads((await self.async_client.get(path)).content)['content'])
+        self.assertEqual(404, (await self.async_client.get('/api/comment/999')).status_code)
+
+        data = {'content': 'edited'}
+        self.assertEqual(200, (await self.async_client.put(path, data, content_type='application/json')).status_code)
+        comment_list = (await self.async_client.get('/api/article/%d/comment' % self.article.id)).content.decode()
+        self.assertIn('edited', comment_list)
+        self.assertEqual(403, (await self.async_client.put(other_path, data, content_type='application/json')).status_code)
+        self.assertEqual(404, (await self.async_client.put('/api/comment/999', data, content_type='application/json')).status_code)
+
+        self.assertEqual(403, (await self.async_client.delete(other_path)).status_code)
+        self.assertEqual(200, (await self.async_client.delete(path)).status_code)
+        self.assertEqual(404, (await self.async_client.delete(path)).status_code)
+        self.assertEqual(405, (await self.async_client.post(path)).status_code)
+
+@skipUnless(connection.vendor == 'sqlite', 'exercises SQLite file locking')
+class SQLiteConcurrencyTestCase(TransactionTestCase):
+    def test_concurrent_writers(self):
+        import subprocess
+        import sys
+        from django.conf import settings
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.sqlite_concurrency', '--processes', '4', '--writes', '30'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertEqual(0, result['lock_errors'])
+        self.assertEqual(0, result['failures'])
+        self.assertEqual(120, result['ok'])
+        # 60 articles and 60 comments on the seeded article, each written exactly once
+        self.assertEqual(61, result['articles'])
+        self.assertEqual(60, result['comments'])
+        self.assertEqual(60, result['comment_count'])
+
+    def test_retry_on_busy(self):
+        from django.db import OperationalError
+        from .db import retry_on_busy
+        calls = []
+
+        @retry_on_busy
+        def view(request):
+            calls.append(request)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        with override_settings(BLOG_BUSY_BACKOFF=0):
+            self.assertEqual('done', view('request'))
+            self.assertEqual(3, len(calls))
+
+            @retry_on_busy
+            def failing(request):
+                raise OperationalError('no such table')
+            with self.assertRaises(OperationalError):
+                failing('request')
+
+    def test_retry_never_repeats_a_commit(self):
+        from unittest import mock
+        from django.contrib.auth.models import User
+        from django.db import OperationalError
+        from django.test import RequestFactory
+        from . import views
+        from .db import retry_on_busy
+        from .models import Article, Comment
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        article = Article.objects.create(title='T', content='C', author=user)
+        bump = queries.bump_comment_version
+        calls = []
+
+        def locked_once(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return bump(*args, **kwargs)
+
+        request = RequestFactory().post('/api/article/%d/comment' % article.id, json.dumps({'content': 'c'}), content_type='application/json')
+        request.user = user
+        with override_settings(BLOG_BUSY_BACKOFF=0), mock.patch.object(queries, 'bump_comment_version', locked_once):
+            # The insert rolled back with the failed bump, so the retry writes it once
+            self.assertEqual(201, views.comment(request, article.id).status_code)
+        self.assertEqual(1, Comment.objects.count())
+        self.assertEqual(1, Article.objects.get(id=article.id).comment_count)
+
+        @retry_on_busy
+        def commits_then_locks(request):
+            Article.objects.create(title='T', content='C', author=user)
+            raise OperationalError('database is locked')
+
+        with override_settings(BLOG_BUSY_BACKOFF=0):
+            with self.assertRaises(OperationalError):
+                commits_then_locks(request)
+        self.assertEqual(2, Article.objects.count())
+
+    def test_pragmas(self):
+        from django.db import connection as test_connection
+        from .db import apply_pragmas
+        with override_settings(BLOG_SQLITE_PRAGMAS={'cache_size': -1234}):
+            apply_pragmas(None, test_connection)
+            with test_connection.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size')
+                self.assertEqual(-1234, cursor.fetchone()[0])
+
+@override_settings(BLOG_RATE_LIMITS={
+    'default': {'read': (1, 3)},
+    'comment': {'write': (0.5, 1)},
+})
+class RateLimitTestCase(TestCase):
+    def setUp(self):
+        from .models import Article
+        from django.contrib.auth.models import User
+        from . import ratelimit
+        self.user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.article = Article.objects.create(title='First', content='11111', author=self.user)
+        ratelimit.get_store().clear()
+
+    def test_read_budget(self):
+        client = Client()
+        client.force_login(self.user)
+        for _ in range(3):
+            self.assertEqual(200, client.get('/api/article/%d' % self.article.id).status_code)
+        response = client.get('/api/article/%d' % self.article.id)
+        self.assertEqual(429, response.status_code)
+        self.assertEqual('1', response['Retry-After'])
+
+        # Writes to a name without a write budget are not limited
+        self.assertEqual(201, client.post('/api/article', json.dumps({'title': 't', 'content': 'c'}), content_type='application/json').status_code)
+
+        # Budgets are per user; anonymous clients are keyed by IP
+        other = Client(REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(401, other.get('/api/article').status_code)
+
+    def test_write_budget(self):
+        client = Client()
+        client.force_login(self.user)
+        path = '/api/article/%d/comment' % self.article.id
+        self.assertEqual(201, client.post(path, json.dumps({'content': 'c'}), content_type='application/json').status_code)
+        response = client.post(path, json.dumps({'content': 'c'}), content_type='application/json')
+        self.assertEqual(429, response.status_code)
+        self.assertEqual('2', response['Retry-After'])
+
+    def test_buckets(self):
+        from .ratelimit import LocalMemoryStore, CacheStore, consume
+        self.assertEqual((2, 0), consume(3, 0, 1, 3, 0))
+        self.assertEqual((0.5, 0.25), consume(0.5, 0, 2, 3, 0))
+        self.assertEqual((2, 0), consume(0, 0, 1, 3, 10))
+
+        for store in [LocalMemoryStore(), CacheStore('blog')]:
+            store.clear()
+            self.assertEqual(0, store.take('k', 1, 2))
+            self.assertEqual(0, store.take('k', 1, 2))
+            self.assertGreater(store.take('k', 1, 2), 0)
+            self.assertEqual(0, store.take('other', 1, 2))
+            store.clear()
+
+        store = LocalMemoryStore(max_keys=16)
+        for i in range(100):
+            store.take('key%d' % i, 1, 1)
+        self.assertLessEqual(sum(len(buckets) for lock, buckets in store.stripes), 16)
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        from .models import Article
+        from django.contrib.auth.models import User
+        from . import metrics
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.article = Article.objects.create(title='First', content='11111', author=user)
+        self.client = Client()
+        self.client.force_login(user)
+        metrics.reset()
+
+    def test_histogram(self):
+        from .metrics import Histogram, bucket_index, bucket_value, BUCKETS
+        for value in [0, 1, 31, 32, 33, 1000, 123456, 10 ** 9]:
+            self.assertLess(abs(bucket_value(bucket_index(value)) - value), max(1, value * 0.04))
+        self.assertEqual(BUCKETS - 1, bucket_index(2 ** 60))
+
+        histogram = Histogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+        self.assertAlmostEqual(500, histogram.quantile(0.5), delta=20)
+        self.assertAlmostEqual(990, histogram.quantile(0.99), delta=40)
+        self.assertEqual(1000, histogram.count)
+        self.assertEqual(0, Histogram().quantile(0.5))
+
+    def test_endpoint(self):
+        from . import metrics
+        self.client.get('/api/article/%d' % self.article.id)
+        self.client.get('/api/article/%d' % self.article.id)
+        self.client.get('/api/nowhere')
+        recorded = metrics.endpoints['article_detail']
+        self.assertEqual(2, recorded.duration_us.count)
+        self.assertGreater(recorded.response_bytes.total, 0)
+        self.assertIn('unmatched', metrics.endpoints)
+
+        self.assertEqual(404, self.client.get('/api/_metrics').status_code)
+        with override_settings(BLOG_METRICS_ENDPOINT=True):
+            response = self.client.get('/api/_metrics')
+            self.assertEqual(200, response.status_code)
+            text = response.content.decode()
+            self.assertIn('blog_request_duration_seconds{view="article_detail",quantile="0.99"}', text)
+            self.assertIn('blog_request_queries_count{view="article_detail"} 2', text)
+            self.assertIn('blog_cache_requests_total{result="hit"}', text)
+            self.assertEqual(405, self.client.post('/api/_metrics').status_code)
+
+    def test_query_timer(self):
+        from . import metrics
+        metrics.reset()
+        self.client.get('/api/article')
+        self.assertGreaterEqual(metrics.endpoints['article'].queries.total, 2)
+
+class SeedBlogTestCase(TestCase):
+    def test_seed_blog(self):
+        from io import StringIO
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.db.models import Sum
+        from .models import Article, Comment
+        out = StringIO()
+        call_command('seed_blog', users=5, articles=20, comments=100, stdout=out)
+        self.assertIn('Seeded 5 users, 20 articles and 100 comments', out.getvalue())
+        self.assertEqual(5, User.objects.count())
+        self.assertEqual(20, Article.objects.count())
+        self.assertEqual(100, Comment.objects.count())
+        self.assertEqual(100, Article.objects.aggregate(total=Sum('comment_count'))['total'])
+        self.assertTrue(Article.objects.filter(title__lte='~').exists())
+
+        client = Client()
+        response = client.post('/api/signin', json.dumps({'username': 'seed0', 'password': 'seed-password'}), content_type='application/json')
+        self.assertEqual(204, response.status_code)
+
+class BenchmarkSuiteTestCase(SimpleTestCase):
+    def test_compare(self):
+        from benchmarks.api import compare
+        baseline = {'article_get': {'p50_ms': 2.0, 'queries': 1}}
+        self.assertEqual([], compare({'article_get': {'p50_ms': 2.9, 'queries': 1}}, baseline, 0.5, 1.0))
+        self.assertEqual(
+            ['article_get: 2 queries, baseline 1', 'article_get: p50 3.100ms, baseline 2.000ms'],
+            compare({'article_get': {'p50_ms': 3.1, 'queries': 2}}, baseline, 0.5, 1.0),
+        )
+        self.assertEqual([], compare({'signin': {'p50_ms': 500.0, 'queries': 7}}, baseline, 0.5, 1.0))
+
+    def test_check_coverage(self):
+        from benchmarks.api import check_coverage
+        from . import urls
+        check_coverage(pattern.name for pattern in urls.urlpatterns)
+        with self.assertRaisesMessage(SystemExit, 'metrics'):
+            check_coverage(pattern.name for pattern in urls.urlpatterns if pattern.name != 'metrics')
+
+class DeletionTestCase(TestCase):
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.other = User.objects.create_user(username='other', password='iluvswpp')
+        self.article = Article.objects.create(title='T', content='C', author=self.user)
+        self.other_article = Article.objects.create(title='O', content='C', author=self.other)
+        Comment.objects.bulk_create([Comment(article=self.article, content='c%d' % i, author=self.other) for i in range(30)])
+        for i in range(3):
+            Comment.objects.create(article=self.other_article, content='mine', author=self.user)
+        Comment.objects.create(article=self.other_article, content='theirs', author=self.other)
+        queries.rebuild_comment_counts()
+        self.client = Client()
+        self.client.force_login(self.user)
+        caching.clear()
+
+    def test_article_delete_does_not_load_comments(self):
+        from .models import Article, Comment
+        path = '/api/article/%d' % self.article.id
+        self.client.get(path)
+        with self.assertNumQueries(3):
+            response = self.client.delete(path)
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(Article.objects.filter(id=self.article.id).exists())
+        self.assertEqual(0, Comment.objects.filter(article_id=self.article.id).count())
+        self.assertEqual(404, self.client.get(path).status_code)
+
+    def test_background_delete(self):
+        from .models import Article, Comment, Job
+        from . import jobs
+        path = '/api/article/%d' % self.article.id
+        with override_settings(BLOG_DELETE_BACKGROUND_COMMENTS=10), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(202, self.client.delete(path).status_code)
+        # Queued in the database, so a restart does not lose it
+        self.assertEqual(['blog.deletion.run_background_delete'], list(Job.objects.values_list('task', flat=True)))
+        self.assertTrue(Article.objects.filter(id=self.article.id).exists())
+        self.assertEqual(1, jobs.run_pending())
+        self.assertFalse(Article.objects.filter(id=self.article.id).exists())
+        self.assertEqual(4, Comment.objects.count())
+
+        path = '/api/article/%d' % self.other_article.id
+        self.client.force_login(self.other)
+        with override_settings(BLOG_DELETE_BACKGROUND_COMMENTS=1, BLOG_DELETE_IN_WORKER=False):
+            self.assertEqual(200, self.client.delete(path).status_code)
+        self.assertEqual(0, Article.objects.count())
+        self.assertEqual(0, Comment.objects.count())
+
+    def test_drain_bumps_version_per_chunk(self):
+        from .models import Article
+        from . import deletion
+        path = '/api/article/%d/comment' % self.article.id
+        self.assertEqual(30, len(json.loads(self.client.get(path).content.decode())))
+        self.assertEqual(30, deletion.drain_comments([self.article.id], chunk_size=7))
+        article = Article.objects.get(id=self.article.id)
+        # 7 + 7 + 7 + 7 + 2
+        self.assertEqual(self.article.comment_version + 5, article.comment_version)
+        self.assertEqual(0, article.comment_count)
+        self.assertEqual([], json.loads(self.client.get(path).content.decode()))
+        self.assertEqual(1, deletion.delete_articles([self.article.id]))
+
+    def test_delete_user(self):
+        from io import StringIO
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from .models import Article, Comment
+        call_command('delete_user', 'swpp', stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='swpp').exists())
+        self.assertEqual([self.other_article.id], list(Article.objects.values_list('id', flat=True)))
+        self.assertEqual(['theirs'], list(Comment.objects.values_list('content', flat=True)))
+        self.other_article.refresh_from_db()
+        self.assertEqual(1, self.other_article.comment_count)
+        with self.assertRaises(CommandError):
+            call_command('delete_user', 'swpp', stdout=StringIO())
+
+job_calls = []
+
+def record_job(*args):
+    job_calls.append(args)
+
+def failing_job():
+    raise ValueError('boom')
+
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        job_calls.clear()
+
+    def test_enqueue_and_run(self):
+        from .models import Job
+        from . import jobs
+        jobs.enqueue(record_job, 1, 'a')
+        jobs.enqueue('blog.tests.record_job', 2)
+        jobs.enqueue(record_job, 3, delay=60)
+        self.assertEqual(2, jobs.run_pending())
+        self.assertEqual([(1, 'a'), (2,)], job_calls)
+        self.assertEqual(0, jobs.run_pending())
+        self.assertEqual(1, Job.objects.count())
+
+    def test_enqueue_on_commit(self):
+        from django.db import transaction
+        from .models import Job
+        from . import jobs
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue_on_commit(record_job, 1)
+            self.assertEqual(0, Job.objects.count())
+        self.assertEqual(1, Job.objects.count())
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    jobs.enqueue_on_commit(record_job, 2)
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(1, Job.objects.count())
+
+    def test_retries(self):
+        from datetime import timedelta
+        from django.db.models import F
+        from .models import Job
+        from . import jobs
+        job = jobs.enqueue(failing_job, max_attempts=2)
+        self.assertEqual(1, jobs.run_pending())
+        job.refresh_from_db()
+        self.assertEqual((Job.QUEUED, 1), (job.status, job.attempts))
+        self.assertIn('ValueError: boom', job.last_error)
+        self.assertEqual(0, jobs.run_pending())
+
+        Job.objects.filter(id=job.id).update(run_at=F('run_at') - timedelta(minutes=1))
+        self.assertEqual(1, jobs.run_pending())
+        job.refresh_from_db()
+        self.assertEqual((Job.FAILED, 2), (job.status, job.attempts))
+        self.assertEqual(0, jobs.run_pending())
+
+    def test_stale_jobs_are_reclaimed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Job
+        from . import jobs
+        job = jobs.enqueue(record_job, 1)
+        self.assertEqual([job.id], jobs.claim(10))
+        self.assertEqual([], jobs.claim(10))
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([job.id], jobs.claim(10))
+
+    def test_worker_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from . import jobs
+        jobs.enqueue(record_job, 1)
+        jobs.enqueue(failing_job, max_attempts=1)
+        out = StringIO()
+        call_command('run_blog_worker', processes=0, once=True, stdout=out)
+        self.assertEqual('Ran 2 jobs, 1 failed\n', out.getvalue())
+        self.assertEqual([(1,)], job_calls)
+
+class GroupCommitTestCase(TransactionTestCase):
+    def setUp(self):
+        from .models import Article
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.articles = [Article.objects.create(title='T%d' % i, content='C', author=self.user) for i in range(2)]
+        caching.clear()
+
+    def comment(self, article_id, content='c'):
+        from .models import Comment
+        return Comment(article_id=article_id, content=content, author=self.user)
+
+    def test_batches_from_many_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from .models import Article, Comment
+        from .group_commit import GroupCommitter
+        committer = GroupCommitter(max_items=10, max_delay=0.01)
+        with ThreadPoolExecutor(8) as pool:
+            futures = list(pool.map(lambda i: committer.submit(self.comment(self.articles[i % 2].id, 'c%d' % i)), range(40)))
+        saved = [future.result(timeout=10) for future in futures]
+        self.assertTrue(all(comment.pk for comment in saved))
+        self.assertEqual(40, Comment.objects.count())
+        self.assertEqual([20, 20], list(Article.objects.order_by('id').values_list('comment_count', flat=True)))
+
+    def test_bad_row_fails_alone(self):
+        from django.db import IntegrityError
+        from .models import Comment
+        from .group_commit import GroupCommitter
+        committer = GroupCommitter(max_items=10, max_delay=0.05)
+        good = committer.submit(self.comment(self.articles[0].id))
+        bad = committer.submit(self.comment(999))
+        self.assertIsNotNone(good.result(timeout=10).pk)
+        self.assertRaises(IntegrityError, bad.result, timeout=10)
+        self.assertEqual(1, Comment.objects.count())
+
+    def test_lock_error_fails_whole_batch(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from . import group_commit
+        committer = group_commit.GroupCommitter(max_items=10, max_delay=0.05)
+        # No per-row retries: they would each wait out the busy timeout again
+        with mock.patch.object(group_commit, 'write_comments', side_effect=OperationalError('database is locked')) as write:
+            futures = [committer.submit(self.comment(self.articles[0].id)) for _ in range(3)]
+            for future in futures:
+                self.assertRaises(OperationalError, future.result, timeout=10)
+        self.assertEqual(1, write.call_count)
+
+    @override_settings(BLOG_COMMENT_GROUP_COMMIT=True, BLOG_COMMENT_GROUP_COMMIT_TIMEOUT=0.05)
+    def test_timeout_withdraws_comment(self):
+        import threading
+        from unittest import mock
+        from .models import Comment
+        from . import group_commit
+        release = threading.Event()
+        batches = []
+        write_comments = group_commit.write_comments
+
+        def stalled(comments):
+            batches.append([comment.content for comment in comments])
+            release.wait(10)
+            write_comments(comments)
+
+        committer = group_commit.GroupCommitter(max_items=1, max_delay=0)
+        client = Client()
+        client.force_login(self.user)
+        with mock.patch.object(group_commit, 'committer', committer), mock.patch.object(group_commit, 'write_comments', stalled):
+            first = committer.submit(self.comment(self.articles[0].id, 'first'))
+            response = client.post('/api/article/%d/comment' % self.articles[0].id, json.dumps({'content': 'late'}), content_type='application/json')
+            self.assertEqual(503, response.status_code)
+            self.assertEqual('1', response['Retry-After'])
+            release.set()
+            first.result(timeout=10)
+            committer.submit(self.comment(self.articles[0].id, 'next')).result(timeout=10)
+        # The withdrawn comment never reached the database
+        self.assertEqual([['first'], ['next']], batches)
+        self.assertEqual(['first', 'next'], list(Comment.objects.order_by('id').values_list('content', flat=True)))
+
+    @override_settings(BLOG_COMMENT_GROUP_COMMIT=True)
+    def test_comment_post(self):
+        from .models import Article
+        client = Client()
+        client.force_login(self.user)
+        path = '/api/article/%d/comment' % self.articles[0].id
+        self.assertEqual([], json.loads(client.get(path).content))
+        response = client.post(path, json.dumps({'content': 'grouped'}), content_type='application/json')
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(['grouped'], [c['content'] for c in json.loads(client.get(path).content)])
+        self.assertEqual(1, Article.objects.get(id=self.articles[0].id).comment_count)
+
+class PartialResponseTestCase(TestCase):
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.article = Article.objects.create(title='First', content='abcdefgh', author=user)
+        Article.objects.create(title='Second', content='ijklmnop', author=user)
+        Comment.objects.create(article=self.article, content='comment body', author=user)
+        self.client = Client()
+        self.client.force_login(user)
+        caching.clear()
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        return response.status_code, json.loads(response.content) if response.status_code == 200 else None
+
+    def test_article_list(self):
+        from django.test.utils import CaptureQueriesContext
+        self.assertEqual((200, [{'title': 'First'}, {'title': 'Second'}]), self.get('/api/article', fields='title'))
+        with CaptureQueriesContext(connection) as captured:
+            status, articles = self.get('/api/article', fields='content,title', content_max='3')
+        self.assertEqual([{'content': 'abc', 'title': 'First'}, {'content': 'ijk', 'title': 'Second'}], articles)
+        self.assertIn('SUBSTR', captured.captured_queries[-1]['sql'])
+
+        status, page = self.get('/api/article', fields='title', limit='1')
+        self.assertEqual([{'id': self.article.id, 'title': 'First'}], page['articles'])
+        status, articles = self.get('/api/article', fields='title', comment_count='', recent_comments='1', content_max='0')
+        self.assertEqual({'id', 'title', 'comment_count', 'recent_comments'}, set(articles[0]))
+        response = self.client.get('/api/article', {'fields': 'title', 'content_max': '2', 'stream': 'ndjson'})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual({'id': self.article.id, 'title': 'First'}, json.loads(lines[0]))
+
+        for params in [{'fields': 'password'}, {'fields': ','}, {'content_max': '-1'}, {'content_max': 'x'}]:
+            self.assertEqual(400, self.client.get('/api/article', params).status_code)
+
+    def test_comment_list(self):
+        path = '/api/article/%d/comment' % self.article.id
+        response = self.client.get(path)
+        self.assertEqual('comment body', json.loads(response.content)[0]['content'])
+        partial = self.client.get(path, {'fields': 'content', 'content_max': '7'})
+        self.assertEqual([{'content': 'comment'}], json.loads(partial.content))
+        self.assertNotEqual(response['ETag'], partial['ETag'])
+        self.assertEqual(400, self.client.get(path, {'fields': 'id'}).status_code)
+
+@override_settings(BLOG_REPLICAS=['replica1'])
+class ReplicaRoutingTestCase(SimpleTestCase):
+    def route(self, method, path, cookies=None):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from django.urls import resolve
+        from .middleware import ReplicaMiddleware
+        from . import routers
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            seen.append(routers.replica.get())
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        response = middleware(request)
+        self.assertIsNone(routers.replica.get())
+        return seen[0], response
+
+    def test_routing(self):
+        from django.contrib.auth.models import User
+        from .models import Article
+        from .routers import ReplicaRouter
+        from . import routers
+        self.assertEqual('replica1', self.route('get', '/api/article')[0])
+        self.assertEqual('replica1', self.route('get', '/api/comment/1')[0])
+        self.assertIsNone(self.route('get', '/api/article/search')[0])
+        self.assertIsNone(self.route('get', '/api/article', {'blog_primary': '1'})[0])
+
+        alias, response = self.route('post', '/api/article')
+        self.assertIsNone(alias)
+        self.assertEqual(5, response.cookies['blog_primary']['max-age'])
+        with override_settings(BLOG_REPLICAS=[]):
+            self.assertNotIn('blog_primary', self.route('post', '/api/article')[1].cookies)
+
+        router = ReplicaRouter()
+        routers.use_replica('replica1')
+        try:
+            self.assertEqual('replica1', router.db_for_read(Article))
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual('default', router.db_for_write(Article))
+        finally:
+            routers.use_replica(None)
+        self.assertIsNone(router.db_for_read(Article))
+        self.assertFalse(router.allow_migrate('replica1', 'blog'))
+        self.assertIsNone(router.allow_migrate('default', 'blog'))
+
+    def test_replica_reads_are_not_cached(self):
+        from . import routers
+        routers.use_replica('replica1')
+        try:
+            self.assertEqual('stale', caching.read_through('blog:test', lambda: 'stale'))
+        finally:
+            routers.use_replica(None)
+        self.assertEqual('fresh', caching.read_through('blog:test', lambda: 'fresh'))
+        self.assertEqual('fresh', caching.read_through('blog:test', lambda: 'other'))
+        caching.clear()
+
+    def test_replica_comment_lists_are_cached(self):
+        from unittest import mock
+        from . import routers
+        routers.use_replica('replica1')
+        try:
+            # The version in the key was read from the same replica as the list
+            with mock.patch.object(queries, 'comment_list', return_value=[(1, 'c1', 1)]):
+                self.assertEqual('c1', caching.comment_list(1, 7)[0]['content'])
+            with mock.patch.object(queries, 'comment_list', return_value=[]):
+                self.assertEqual('c1', caching.comment_list(1, 7)[0]['content'])
+        finally:
+            routers.use_replica(None)
+            caching.clear()
+
+class SettingsProfileTestCase(SimpleTestCase):
+    def test_parse_importtime(self):
+        from .management.commands.measure_startup import parse_importtime
+        stderr = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       300 |        300 |   django.utils',
+            'import time:      1200 |       1500 | django',
+            'noise',
+        ])
+        self.assertEqual((1.5, [{'module': 'django', 'ms': 1.2}]), parse_importtime(stderr, 1))
+
+    def test_api_profile(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('measure_startup', profiles=['api'], requests=20, boots=1, stdout=out)
+        report = json.loads(out.getvalue())['api']
+        self.assertEqual(4, report['installed_apps'])
+        self.assertEqual(8, report['middleware'])
+        self.assertGreater(report['import_ms'], 0)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the change log is filled by SQLite triggers')
+class ChangeFeedTestCase(TestCase):
+    def setUp(self):
+        from .models import Article
+        from django.contrib.auth.models import User
+        user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.article = Article.objects.create(title='T', content='C', author=user)
+        self.client = Client()
+        self.client.force_login(user)
+        caching.clear()
+
+    def feed(self, **params):
+        response = self.client.get('/api/changes', params)
+        self.assertEqual(200, response.status_code)
+        return json.loads(response.content)
+
+    def test_feed(self):
+        head = self.feed()['next']
+        self.assertEqual({'changes': [], 'next': head, 'more': False}, self.feed(since=head))
+
+        self.client.post('/api/article', json.dumps({'title': 'A', 'content': 'a'}), content_type='application/json')
+        self.client.put('/api/article/%d' % self.article.id, json.dumps({'title': 'T2', 'content': 'C2'}), content_type='application/json')
+        path = '/api/article/%d/comment' % self.article.id
+        self.client.post(path, json.dumps({'content': 'c1'}), content_type='application/json')
+        self.client.post(path + '/bulk', json.dumps([{'content': 'c2'}]), content_type='application/json')
+        comment_ids = [comment['id'] for comment in self.feed(since=head)['changes'] if comment['model'] == 'comment']
+        self.client.put('/api/comment/%d' % comment_ids[0], json.dumps({'content': 'c1!'}), content_type='application/json')
+        self.client.delete('/api/comment/%d' % comment_ids[1])
+
+        feed = self.feed(since=head)
+        self.assertEqual([
+            ('article', 'upsert'), ('article', 'upsert'), ('comment', 'upsert'), ('comment', 'upsert'),
+            ('comment', 'upsert'), ('comment', 'delete'),
+        ], [(change['model'], change['action']) for change in feed['changes']])
+        self.assertEqual({'title': 'T2', 'content': 'C2', 'author': self.article.author_id}, feed['changes'][1]['data'])
+        self.assertEqual('c1!', feed['changes'][2]['data']['content'])
+        self.assertIsNone(feed['changes'][5]['data'])
+        self.assertEqual(feed['changes'][-1]['seq'], feed['next'])
+
+        # Deleting the article logs the article alone, not each of its comments
+        self.client.delete('/api/article/%d' % self.article.id)
+        self.assertEqual(
+            [('article', self.article.id, 'delete')],
+            [(change['model'], change['id'], change['action']) for change in self.feed(since=feed['next'])['changes']],
+        )
+
+        page = self.feed(since=head, limit=2)
+        self.assertEqual(2, len(page['changes']))
+        self.assertTrue(page['more'])
+        self.assertEqual(page['changes'][0]['seq'], self.feed(since=head, limit=1)['next'])
+
+    def test_delete_user(self):
+        from django.contrib.auth.models import User
+        from .models import Article, Comment
+        from . import deletion
+        other = User.objects.create_user(username='other', password='iluvswpp')
+        other_article = Article.objects.create(title='O', content='C', author=other)
+        Comment.objects.bulk_create([Comment(article=self.article, content='c', author=other) for _ in range(20)])
+        mine = Comment.objects.create(article=other_article, content='mine', author=self.article.author)
+        head = self.feed()['next']
+        deletion.delete_user(self.article.author_id)
+        # One delete for the article, none for the 20 comments under it, one for the comment under the other article
+        self.client.force_login(other)
+        self.assertEqual(
+            [('article', self.article.id), ('comment', mine.id)],
+            [(change['model'], change['id']) for change in self.feed(since=head)['changes']],
+        )
+
+    def test_errors_and_compaction(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import Change
+        self.client.put('/api/article/%d' % self.article.id, json.dumps({'title': 'T2', 'content': 'C2'}), content_type='application/json')
+        for params in [{'since': 'x'}, {'since': '-1'}, {'since': '0', 'limit': '0'}]:
+            self.assertEqual(400, self.client.get('/api/changes', params).status_code)
+        self.assertEqual(405, self.client.post('/api/changes').status_code)
+
+        latest = self.feed()['next']
+        Change.objects.update(created_at=timezone.now() - timedelta(days=30))
+        out = StringIO()
+        call_command('compact_changes', days=7, stdout=out)
+        self.assertEqual('Deleted 1 change log entries\n', out.getvalue())
+        self.assertEqual(410, self.client.get('/api/changes', {'since': 0}).status_code)
+        self.assertEqual([], self.feed(since=latest)['changes'])
+        self.assertEqual(1, len(self.feed(since=latest - 1)['changes']))
+
+        self.client.logout()
+        self.assertEqual(401, self.client.get('/api/changes', {'since': 0}).status_code)
+
+
+@override_settings(BLOG_STREAM_KEEPALIVE=0.01)
+class CommentStreamTestCase(TestCase):
+    def setUp(self):
+        from .models import Article
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.article = Article.objects.create(title='T', content='C', author=self.user)
+        self.other = Article.objects.create(title='O', content='O', author=self.user)
+        self.path = '/api/article/%d/comment/stream' % self.article.id
+        self.client.force_login(self.user)
+
+    def post_comment(self, article, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/article/%d/comment' % article.id, json.dumps({'content': content}), content_type='application/json')
+
+    def event(self, events):
+        frame = next(events)
+        if frame.startswith(b':'):
+            return None
+        return json.loads(frame.split(b'data: ', 1)[1])
+
+    def test_stream(self):
+        from . import bulk, live
+        response = self.client.get(self.path)
+        self.assertEqual('text/event-stream', response['Content-Type'])
+        events = iter(response.streaming_content)
+        self.assertEqual(b'retry: 1000\n\n', next(events))
+        # Idle streams only send keepalives, and never touch the database
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.event(events))
+
+        self.post_comment(self.article, 'live')
+        self.post_comment(self.other, 'elsewhere')
+        event = self.event(events)
+        self.assertEqual({'article': self.article.id, 'content': 'live', 'author': self.user.id}, {key: event[key] for key in ('article', 'content', 'author')})
+        self.assertIsNone(self.event(events))
+
+        # Paths that bypass post_save publish too
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.create_comments(self.article.id, [{'content': 'b1'}, {'content': 'b2'}], self.user)
+        self.assertEqual(['b1', 'b2'], [self.event(events)['content'], self.event(events)['content']])
+
+        response.close()
+        self.assertFalse(live.hub.watching(self.article.id))
+
+    def test_catch_up(self):
+        from .models import Comment
+        first = Comment.objects.create(article=self.article, content='seen', author=self.user)
+        Comment.objects.create(article=self.article, content='missed', author=self.user)
+        response = self.client.get(self.path, headers={'Last-Event-ID': str(first.id)})
+        events = iter(response.streaming_content)
+        next(events)
+        self.assertEqual('missed', self.event(events)['content'])
+        self.assertIsNone(self.event(events))
+        response.close()
+
+    @override_settings(BLOG_STREAM_QUEUE_SIZE=2)
+    def test_slow_consumer_dropped(self):
+        from . import live
+        response = self.client.get(self.path)
+        events = iter(response.streaming_content)
+        next(events)
+        for content in ['1', '2', '3']:
+            self.post_comment(self.article, content)
+        self.assertFalse(live.hub.watching(self.article.id))
+        # What was queued is still delivered, then the stream ends and the client reconnects
+        self.assertEqual(['1', '2'], [self.event(events)['content'], self.event(events)['content']])
+        self.assertRaises(StopIteration, next, events)
+
+    def test_errors(self):
+        self.assertEqual(404, self.client.get('/api/article/999/comment/stream').status_code)
+        self.assertEqual(400, self.client.get(self.path, headers={'Last-Event-ID': 'x'}).status_code)
+        self.assertEqual(405, self.client.post(self.path).status_code)
+        self.client.logout()
+        self.assertEqual(401, self.client.get(self.path).status_code)
+
+    @override_settings(ROOT_URLCONF='myblog.asgi_urls', BLOG_STREAM_KEEPALIVE=60)
+    async def test_async_stream(self):
+        import asyncio
+        from . import live
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.path)
+        events = aiter(response.streaming_content)
+        self.assertEqual(b'retry: 1000\n\n', await anext(events))
+        live.hub.publish(self.article.id, [live.encode(1, {'content': 'live'})])
+        self.assertIn(b'"live"', await anext(events))
+        # A client disconnect cancels the task serving the stream
+        waiting = asyncio.create_task(anext(events))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertFalse(live.hub.watching(self.article.id))
+
+
+class PayloadValidationTestCase(TestCase):
+    def setUp(self):
+        from .models import Article, Comment
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_user(username='swpp', password='iluvswpp')
+        self.article = Article.objects.create(title='T', content='C', author=self.user)
+        self.comment = Comment.objects.create(article=self.article, content='c', author=self.user)
+        self.client.force_login(self.user)
+        # Load the session and user once, so what is left is the view's own queries
+        self.client.get('/api/token')
+
+    def status(self, method, path, body):
+        data = body if isinstance(body, bytes) else json.dumps(body)
+        return getattr(self.client, method)(path, data, content_type='application/json').status_code
+
+    def test_malformed(self):
+        article = '/api/article/%d' % self.article.id
+        comment = '/api/comment/%d' % self.comment.id
+        cases = [
+            ('post', '/api/article', b'{"title": '),
+            ('post', '/api/article', b'\xff\xfe'),
+            ('post', '/api/article', ['T', 'C']),
+            ('post', '/api/article', {'title': 'T'}),
+            ('post', '/api/article', {'title': 1, 'content': 'C'}),
+            ('post', '/api/article', {'title': 'x' * 121, 'content': 'C'}),
+            ('put', article, {'title': 'T', 'content': None}),
+            ('post', article + '/comment', {'text': 'c'}),
+            ('put', comment, {'content': ['c']}),
+            ('post', '/api/article/bulk', [{'title': 'x' * 121, 'content': 'C'}]),
+            ('put', '/api/comment/bulk', [{'id': True, 'content': 'c'}]),
+            ('delete', '/api/comment/bulk', [1.5]),
+        ]
+        for method, path, body in cases:
+            with self.subTest(method=method, path=path, body=body), self.assertNumQueries(0):
+                self.assertEqual(400, self.status(method, path, body))
+        self.assertEqual(201, self.status('post', '/api/article', {'title': 'x' * 120, 'content': 'C', 'extra': 1}))
+
+    @override_settings(BLOG_MAX_BODY_SIZE=100, BLOG_MAX_BULK_BODY_SIZE=200, BLOG_MAX_CONTENT_LENGTH=10)
+    def test_limits(self):
+        path = '/api/article/%d/comment' % self.article.id
+        with self.assertNumQueries(0):
+            self.assertEqual(413, self.status('post', path, {'content': 'c' * 100}))
+            self.assertEqual(400, self.status('post', path, {'content': 'c' * 11}))
+            self.assertEqual(413, self.status('post', path + '/bulk', [{'content': 'c'}] * 20))
+        self.assertEqual(201, self.status('post', path, {'content': 'c' * 10}))
+        self.assertEqual(201, self.status('post', path + '/bulk', [{'content': 'c'}] * 10))
+
+    def test_auth(self):
+        self.client.logout()
+        for body in [{'username': 'jun'}, {'username': '', 'password': 'p'}, {'username': 'x' * 151, 'password': 'p'}, b'[']:
+            with self.subTest(body=body):
+                self.assertEqual(400, self.status('post', '/api/signup', body))
+                self.assertEqual(400, self.status('post', '/api/signin', body))
+        with override_settings(BLOG_MAX_PASSWORD_LENGTH=8):
+            self.assertEqual(400, self.status('post', '/api/signin', {'username': 'swpp', 'password': 'iluvswpp!'}))
+            self.assertEqual(204, self.status('post', '/api/signin', {'username': 'swpp', 'password': 'iluvswpp'}))
+
+    @override_settings(ROOT_URLCONF='myblog.asgi_urls', BLOG_MAX_BODY_SIZE=100)
+    async def test_async(self):
+        await self.async_client.aforce_login(self.user)
+        path = '/api/article/%d/comment' % self.article.id
+        response = await self.async_client.post(path, {'content': 'c' * 100}, content_type='application/json')
+        self.assertEqual(413, response.status_code)
+        response = await self.async_client.post('/api/article', {'title': 'T'}, content_type='application/json')
+        self.assertEqual(400, response.status_code)
@@ -7,7 +7,14 @@ urlpatterns = [
     path('signin', views.signin, name='signin'),
     path('signout', views.signout, name='signout'),
     path('article', views.article, name='article'),
+    path('article/bulk', views.article_bulk, name='article_bulk'),
+    path('article/search', views.article_search, name='article_search'),
     path('article/<int:article_id>', views.article_detail, name='article_detail'),
     path('article/<int:article_id>/comment', views.comment, name='comment'),
+    path('article/<int:article_id>/comment/stream', views.comment_stream, name='comment_stream'),
+    path('article/<int:article_id>/comment/bulk', views.article_comment_bulk, name='article_comment_bulk'),
+    path('comment/bulk', views.comment_bulk, name='comment_bulk'),
     path('comment/<int:comment_id>', views.comment_detail, name='comment_detail'),
+    path('changes', views.changes, name='changes'),
+    path('_metrics', views.prometheus_metrics, name='metrics'),
 ]
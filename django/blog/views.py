@@ -1,17 +1,35 @@
-from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.contrib.auth import login, logout, authenticate
-from django.forms.models import model_to_dict
-from .models import Comment, Article
-import json
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db import IntegrityError
+from .models import Comment, Article, Change
+from django.conf import settings
+from . import queries, caching, bulk, deletion, group_commit, live, payloads, serialization, metrics
+from .db import retry_on_busy
+import calendar
+import hashlib
 
+ARTICLE_PAGE_SIZE = 100
+ARTICLE_PAGE_MAX = 1000
+ARTICLE_STREAM_CHUNK = 2000
+STREAM_FORMATS = ('json', 'ndjson')
+RECENT_COMMENTS_MAX = 20
+CHANGE_PAGE_SIZE = 100
+CHANGE_PAGE_MAX = 1000
+STREAM_CATCH_UP_MAX = 1000
 
+
+@retry_on_busy
 def signup(request):
     if request.method == 'POST':
-        req_data = json.loads(request.body.decode())
-        username = req_data['username']
-        password = req_data['password']
+        try:
+            username, password = payloads.parse_auth(request)
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
         User.objects.create_user(username=username, password=password)
         return HttpResponse(status=201)
     else:
@@ -28,9 +46,10 @@ def token(request):
 
 def signin(request):
     if request.method == 'POST':
-        req_data = json.loads(request.body.decode())
-        username = req_data['username']
-        password = req_data['password']
+        try:
+            username, password = payloads.parse_auth(request)
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
         user = authenticate(username=username, password=password)
 
         if user is not None:
@@ -51,121 +70,424 @@ def signout(request):
     else:
         return HttpResponseNotAllowed(['GET'])
 
+@retry_on_busy
 def article(request):
     if request.method == 'GET':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
-        article_list = [Article for Article in Article.objects.all().values('title', 'content', 'author')]
-        return JsonResponse(article_list, safe=False)
+        with_comments = 'comment_count' in request.GET or 'recent_comments' in request.GET
+        validator = queries.article_list_validator(with_comments)
+        etag = make_etag('articles', sorted(validator.items()), request.GET.urlencode())
+        # ETag only: no Last-Modified, since deleting an article moves no updated_at
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        return with_validators(article_list_response(request), etag, None)
     elif request.method == 'POST':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
-        req_data = json.loads(request.body.decode())
-        title = req_data['title']
-        content = req_data['content']
+        try:
+            title, content = payloads.parse(request, 'title', 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
         new_article = Article(title=title, content=content, author=request.user)
         new_article.save()
         return HttpResponse(status=201)
     else:
         return HttpResponseNotAllowed(['GET', 'POST'])        
 
+def article_list_options(request):
+    # (limit, after, recent, stream, fields, content_max) from the query string; None if malformed
+    try:
+        limit = int(request.GET.get('limit', ARTICLE_PAGE_SIZE))
+        after = int(request.GET.get('after', 0))
+        recent = int(request.GET.get('recent_comments', 0))
+    except ValueError:
+        return None
+    if limit < 1 or recent < 0:
+        return None
+    projection = list_projection(request, queries.ARTICLE_FIELDS)
+    if projection is None:
+        return None
+    fields, content_max = projection
+    if 'comment_count' in request.GET:
+        fields += ('comment_count',)
+    stream = request.GET.get('stream')
+    # Streamed rows come straight off the cursor, with nothing attached
+    if stream is not None and (stream not in STREAM_FORMATS or 'recent_comments' in request.GET):
+        return None
+    return limit, after, recent, stream, fields, content_max
 
-def article_detail(request, article_id):
+def article_list_response(request):
+    options = article_list_options(request)
+    if options is None:
+        return HttpResponseBadRequest()
+    limit, after, recent, stream, fields, content_max = options
+    if stream is not None:
+        return stream_article_list(stream, fields, content_max)
+    if 'limit' in request.GET or 'after' in request.GET:
+        page = queries.article_page(min(limit, ARTICLE_PAGE_MAX), after, fields, content_max)
+        attach_recent_comments(page['articles'], recent)
+        return serialization.json_response(page)
+    if recent:
+        article_list = serialization.row_dicts(('id',) + fields, queries.article_rows(fields, content_max))
+        attach_recent_comments(article_list, recent)
+    else:
+        article_list = serialization.row_dicts(fields, queries.article_list(fields, content_max))
+    return serialization.json_response(article_list)
+
+def list_projection(request, allowed):
+    # (fields, content_max) from ?fields=a,b and ?content_max=N, all of allowed and no limit by default; None if malformed
+    fields = allowed
+    if 'fields' in request.GET:
+        fields = tuple(dict.fromkeys(field for field in request.GET['fields'].split(',') if field))
+        if not fields or any(field not in allowed for field in fields):
+            return None
+    content_max = request.GET.get('content_max')
+    if content_max is not None:
+        try:
+            content_max = int(content_max)
+        except ValueError:
+            return None
+        if content_max < 0:
+            return None
+    return fields, content_max
+
+def attach_recent_comments(rows, recent):
+    if not recent:
+        return
+    comments = queries.recent_comments([row['id'] for row in rows], min(recent, RECENT_COMMENTS_MAX))
+    for row in rows:
+        row['recent_comments'] = comments[row['id']]
+
+def stream_article_list(stream, fields=queries.ARTICLE_FIELDS, content_max=None):
+    names = ('id',) + fields
+    rows = (dict(zip(names, row)) for row in queries.article_rows(fields, content_max).iterator(chunk_size=ARTICLE_STREAM_CHUNK))
+    if stream == 'ndjson':
+        content = (serialization.dumps(row) + b'\n' for row in rows)
+        return StreamingHttpResponse(content, content_type='application/x-ndjson')
+    return StreamingHttpResponse(json_array_chunks(rows), content_type='application/json')
+
+def astream_article_list(stream, fields=queries.ARTICLE_FIELDS, content_max=None):
+    # Over an async iterator, so the ASGI handler sends it chunk by chunk instead of reading it all into a list
+    names = ('id',) + fields
+    rows = (dict(zip(names, row)) async for row in queries.aiterate(queries.article_rows(fields, content_max), ARTICLE_STREAM_CHUNK))
+    if stream == 'ndjson':
+        content = (serialization.dumps(row) + b'\n' async for row in rows)
+        return StreamingHttpResponse(content, content_type='application/x-ndjson')
+    return StreamingHttpResponse(ajson_array_chunks(rows), content_type='application/json')
+
+def json_array_chunks(rows):
+    yield b'['
+    first = True
+    for row in rows:
+        if first:
+            first = False
+            yield serialization.dumps(row)
+        else:
+            yield b',' + serialization.dumps(row)
+    yield b']'
+
+async def ajson_array_chunks(rows):
+    yield b'['
+    first = True
+    async for row in rows:
+        if first:
+            first = False
+            yield serialization.dumps(row)
+        else:
+            yield b',' + serialization.dumps(row)
+    yield b']'
+
+def make_etag(*parts):
+    # Strong validator: the parts fully determine the response body
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def timestamp(value):
+    return calendar.timegm(value.utctimetuple()) if value is not None else None
+
+def with_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(timestamp(last_modified))
+    return response
+
+def denied_status(queryset):
+    # The owner-filtered write touched nothing: either the row is missing or it belongs to someone else
+    return 403 if queryset.exists() else 404
+
+
+def article_search(request):
     if request.method == 'GET':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
+        q = request.GET.get('q', '')
         try:
-            article = Article.objects.get(id=article_id)
-        except Article.DoesNotExist:
+            limit = int(request.GET.get('limit', ARTICLE_PAGE_SIZE))
+            offset = int(request.GET.get('offset', 0))
+        except ValueError:
+            return HttpResponseBadRequest()
+        if not queries.search_terms(q) or limit < 1 or offset < 0:
+            return HttpResponseBadRequest()
+        return serialization.json_response(queries.search_articles(q, min(limit, ARTICLE_PAGE_MAX), offset))
+    else:
+        return HttpResponseNotAllowed(['GET'])
+
+
+@retry_on_busy
+def article_detail(request, article_id):
+    if request.method == 'GET':
+        if not request.user.is_authenticated:
+            return HttpResponse(status=401)
+        article = caching.article(article_id)
+        if article is None:
             return HttpResponse(status=404)
-        article = model_to_dict(article, fields={'title', 'content', 'author'})
-        return JsonResponse(article, safe=False)
+        return serialization.json_response(article)
     elif request.method == 'PUT':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
         try:
-            article = Article.objects.get(id=article_id)
-        except Article.DoesNotExist:
-            return HttpResponse(status=404)
-        if article.author.id != request.user.id:
-            return HttpResponse(status=403)
-        req_data = json.loads(request.body.decode())
-        title = req_data['title']
-        content = req_data['content']
-        article.title = title
-        article.content = content
-        article.save()
-        return HttpResponse(status=200)   
+            title, content = payloads.parse(request, 'title', 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        updated = queries.owned_article(article_id, request.user.id).update(title=title, content=content, updated_at=timezone.now())
+        if not updated:
+            return HttpResponse(status=denied_status(queries.article_by_id(article_id)))
+        caching.article_changed(article_id)
+        return HttpResponse(status=200)
     elif request.method == 'DELETE':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
-        try:
-            article = Article.objects.get(id=article_id)
-        except Article.DoesNotExist:
-            return HttpResponse(status=404)
-        if article.author.id != request.user.id:
-            return HttpResponse(status=403)
-        article.delete()
+        comment_count = queries.owned_article(article_id, request.user.id).values_list('comment_count', flat=True).first()
+        if comment_count is None:
+            return HttpResponse(status=denied_status(queries.article_by_id(article_id)))
+        if comment_count < getattr(settings, 'BLOG_DELETE_BACKGROUND_COMMENTS', 10000):
+            deletion.delete_articles([article_id])
+        elif deletion.delete_articles_in_background([article_id]):
+            return HttpResponse(status=202)
         return HttpResponse(status=200)
     else:
         return HttpResponseNotAllowed(['GET', 'POST', 'DELETE'])        
         
 
+@retry_on_busy
 def comment(request, article_id):
     if request.method == 'GET':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
-        comment_list = [Comment for Comment in Comment.objects.filter(article=article_id).values('article', 'content', 'author')]
-        return JsonResponse(comment_list, safe=False)
+        projection = list_projection(request, queries.COMMENT_FIELDS)
+        if projection is None:
+            return HttpResponseBadRequest()
+        validator = queries.comment_list_validator(article_id)
+        if validator is None:
+            return serialization.json_response([])
+        etag = make_etag('comments', article_id, validator['comment_version'], projection)
+        last_modified = validator['comment_updated_at']
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp(last_modified))
+        if not_modified is not None:
+            return not_modified
+        if projection == (queries.COMMENT_FIELDS, None):
+            comment_list = caching.comment_list(article_id, validator['comment_version'])
+        else:
+            comment_list = serialization.row_dicts(projection[0], queries.comment_list(article_id, *projection))
+        return with_validators(serialization.json_response(comment_list), etag, last_modified)
     elif request.method == 'POST':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
-        req_data = json.loads(request.body.decode())
-        content = req_data['content']
-        new_comment = Comment(article=Article.objects.get(id=article_id), content=content, author=request.user)
-        new_comment.save()
+        try:
+            (content,) = payloads.parse(request, 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        if not queries.article_by_id(article_id).exists():
+            return HttpResponse(status=404)
+        try:
+            if group_commit.enabled():
+                group_commit.save(Comment(article_id=article_id, content=content, author=request.user))
+            else:
+                queries.create_comment(article_id, content, request.user)
+        except group_commit.QueueTimeout:
+            return busy_response()
+        except IntegrityError:
+            # The article was deleted after the check above; its foreign key fails at commit
+            return HttpResponse(status=404)
         return HttpResponse(status=201)
     else:
         return HttpResponseNotAllowed(['GET', 'POST']) 
 
+def busy_response():
+    # Nothing was written, so the client can safely send the same request again
+    response = HttpResponse(status=503)
+    response['Retry-After'] = '1'
+    return response
+
+def last_event_id(request):
+    # EventSource resends the id of the last event it saw when it reconnects
+    value = request.headers.get('Last-Event-ID', '0') or '0'
+    return int(value) if value.isdigit() else None
+
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def comment_stream(request, article_id):
+    if request.method == 'GET':
+        if not request.user.is_authenticated:
+            return HttpResponse(status=401)
+        after_id = last_event_id(request)
+        if after_id is None:
+            return HttpResponseBadRequest()
+        if not queries.article_by_id(article_id).exists():
+            return HttpResponse(status=404)
+        # Subscribe before the catch-up query so nothing committed in between is missed
+        subscription = live.subscribe(article_id)
+        catch_up = live.catch_up(queries.comments_after(article_id, after_id, STREAM_CATCH_UP_MAX)) if after_id else []
+        return event_stream_response(live.stream(subscription, catch_up, getattr(settings, 'BLOG_STREAM_KEEPALIVE', 15)))
+    else:
+        return HttpResponseNotAllowed(['GET'])
+
+@retry_on_busy
 def comment_detail(request, comment_id):
     if request.method == 'GET':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
-        try:
-            comment = Comment.objects.get(id=comment_id)
-        except Comment.DoesNotExist:
+        row = queries.comment_row(comment_id)
+        if row is None:
             return HttpResponse(status=404)
-        comment = model_to_dict(comment, fields={'article', 'content', 'author'})
-        return JsonResponse(comment, safe=False)
+        return serialization.json_response(serialization.row_dict(queries.COMMENT_FIELDS, row))
     elif request.method == 'PUT':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
         try:
-            comment = Comment.objects.get(id=comment_id)
-        except Comment.DoesNotExist:
-            return HttpResponse(status=404)
-        if comment.author.id != request.user.id:
-            return HttpResponse(status=403)
-        req_data = json.loads(request.body.decode())
-        content = req_data['content']
-        comment.content = content
-        comment.save()
+            (content,) = payloads.parse(request, 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        # update() sends no post_save, so fetch the article id for the comment version bump
+        article_id = queries.owned_comment(comment_id, request.user.id).values_list('article_id', flat=True).first()
+        if article_id is None:
+            return HttpResponse(status=denied_status(queries.comment_by_id(comment_id)))
+        queries.update_comment(comment_id, article_id, content)
         return HttpResponse(status=200)
     elif request.method == 'DELETE':
         if not request.user.is_authenticated:
             return HttpResponse(status=401)
-        try:
-            comment = Comment.objects.get(id=comment_id)
-        except Comment.DoesNotExist:
-            return HttpResponse(status=404)
-        if comment.author.id != request.user.id:
-            return HttpResponse(status=403)
-        comment.delete()
+        # The post_delete receivers only need article_id, so the comment body is never read
+        deleted, _ = queries.owned_comment(comment_id, request.user.id).only('id', 'article_id').delete()
+        if not deleted:
+            return HttpResponse(status=denied_status(queries.comment_by_id(comment_id)))
         return HttpResponse(status=200)
     else:
         return HttpResponseNotAllowed(['GET', 'PUT', 'DELETE'])
 
 
+@retry_on_busy
+def article_bulk(request):
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    if request.method == 'POST':
+        try:
+            items = payloads.parse_bulk(request, 'title', 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        return JsonResponse(bulk.create_articles(items, request.user), status=201, safe=False)
+    elif request.method == 'PUT':
+        try:
+            items = payloads.parse_bulk(request, 'id', 'title', 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        return JsonResponse(bulk.update_articles(items, request.user.id), safe=False)
+    elif request.method == 'DELETE':
+        try:
+            ids = payloads.parse_bulk(request)
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        return JsonResponse(bulk.delete_articles(ids, request.user.id), safe=False)
+    else:
+        return HttpResponseNotAllowed(['POST', 'PUT', 'DELETE'])
+
+@retry_on_busy
+def article_comment_bulk(request, article_id):
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    if request.method == 'POST':
+        try:
+            items = payloads.parse_bulk(request, 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        if not queries.article_by_id(article_id).exists():
+            return HttpResponse(status=404)
+        try:
+            return JsonResponse(bulk.create_comments(article_id, items, request.user), status=201, safe=False)
+        except IntegrityError:
+            return HttpResponse(status=404)
+    else:
+        return HttpResponseNotAllowed(['POST'])
+
+@retry_on_busy
+def comment_bulk(request):
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    if request.method == 'PUT':
+        try:
+            items = payloads.parse_bulk(request, 'id', 'content')
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        return JsonResponse(bulk.update_comments(items, request.user.id), safe=False)
+    elif request.method == 'DELETE':
+        try:
+            ids = payloads.parse_bulk(request)
+        except payloads.Invalid as error:
+            return HttpResponse(status=error.status)
+        return JsonResponse(bulk.delete_comments(ids, request.user.id), safe=False)
+    else:
+        return HttpResponseNotAllowed(['PUT', 'DELETE'])
+
+
+def changes(request):
+    if request.method == 'GET':
+        if not request.user.is_authenticated:
+            return HttpResponse(status=401)
+        if 'since' not in request.GET:
+            # Where a new mirror starts following, right before it downloads the lists
+            return serialization.json_response({'changes': [], 'next': queries.latest_change() or 0, 'more': False})
+        try:
+            since = int(request.GET['since'])
+            limit = min(int(request.GET.get('limit', CHANGE_PAGE_SIZE)), CHANGE_PAGE_MAX)
+        except ValueError:
+            return HttpResponseBadRequest()
+        if since < 0 or limit < 1:
+            return HttpResponseBadRequest()
+        oldest = queries.oldest_change()
+        if oldest is not None and since < oldest - 1:
+            # Compacted past this cursor; the client has to download everything again
+            return HttpResponse(status=410)
+        rows = list(queries.changes_since(since, limit + 1))
+        more = len(rows) > limit
+        rows = rows[:limit]
+        upserts = {'article': set(), 'comment': set()}
+        for seq, model, object_id, article_id, action in rows:
+            if action == Change.UPSERT:
+                upserts[model].add(object_id)
+        current = {
+            'article': queries.rows_by_id(Article, queries.ARTICLE_FIELDS, upserts['article']),
+            'comment': queries.rows_by_id(Comment, queries.COMMENT_FIELDS, upserts['comment']),
+        }
+        change_list = [
+            {'seq': seq, 'model': model, 'id': object_id, 'article': article_id, 'action': action, 'data': current[model].get(object_id)}
+            for seq, model, object_id, article_id, action in rows
+        ]
+        return serialization.json_response({'changes': change_list, 'next': rows[-1][0] if rows else since, 'more': more})
+    else:
+        return HttpResponseNotAllowed(['GET'])
 
 
+def prometheus_metrics(request):
+    if not getattr(settings, 'BLOG_METRICS_ENDPOINT', False):
+        return HttpResponse(status=404)
+    if request.method == 'GET':
+        return HttpResponse(metrics.prometheus_text(), content_type='text/plain; version=0.0.4')
+    else:
+        return HttpResponseNotAllowed(['GET'])
@@ -0,0 +1,18 @@
+"""
+ASGI config for myblog project.
+
+It exposes the ASGI callable as a module-level variable named ``application``
+and routes the blog API to the async views (see myblog.asgi_urls).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/stable/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myblog.settings')
+os.environ.setdefault('MYBLOG_URLCONF', 'myblog.asgi_urls')
+
+application = get_asgi_application()
@@ -0,0 +1,16 @@
+"""myblog URL Configuration for the ASGI entry point
+
+Identical to myblog.urls except that the blog API is served by the async
+views in blog.async_views. Selected by myblog.asgi via MYBLOG_URLCONF.
+"""
+from django.apps import apps
+from django.urls import include, path
+
+urlpatterns = [
+    path('api/', include('blog.async_urls')),
+]
+
+# The 'api' settings profile leaves the admin out unless MYBLOG_ADMIN=1
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
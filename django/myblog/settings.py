@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 
 import os
 
+from django.conf import global_settings
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -27,6 +29,13 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# 'full' is the stock project. 'api' is for workers that only serve the JSON
+# API under /api/: no staticfiles, no HTML-only middleware and, unless
+# MYBLOG_ADMIN=1, no admin or messages either.
+SETTINGS_PROFILE = os.environ.get('MYBLOG_SETTINGS_PROFILE', 'full')
+
+ADMIN_ENABLED = SETTINGS_PROFILE == 'full' or os.environ.get('MYBLOG_ADMIN') == '1'
+
 
 # Application definition
 
@@ -41,16 +50,29 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'blog.middleware.RateLimitMiddleware',
+    'blog.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'myblog.urls'
+if SETTINGS_PROFILE == 'api':
+    INSTALLED_APPS.remove('django.contrib.staticfiles')
+    # X-Frame-Options means nothing to JSON clients. CommonMiddleware stays for its ALLOWED_HOSTS check.
+    MIDDLEWARE.remove('django.middleware.clickjacking.XFrameOptionsMiddleware')
+    if not ADMIN_ENABLED:
+        INSTALLED_APPS.remove('django.contrib.admin')
+        INSTALLED_APPS.remove('django.contrib.messages')
+        MIDDLEWARE.remove('django.contrib.messages.middleware.MessageMiddleware')
+
+# myblog.asgi switches this to myblog.asgi_urls
+ROOT_URLCONF = os.environ.get('MYBLOG_URLCONF', 'myblog.urls')
 
 TEMPLATES = [
     {
@@ -68,19 +90,202 @@ TEMPLATES = [
     },
 ]
 
+if not ADMIN_ENABLED:
+    # Nothing else renders templates
+    TEMPLATES = []
+
 WSGI_APPLICATION = 'myblog.wsgi.application'
 
+ASGI_APPLICATION = 'myblog.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# 'plain' keeps SQLite's defaults. 'tuned' is meant for serving concurrent
+# writers: WAL journal, persistent connections, BEGIN IMMEDIATE transactions
+# and a busy timeout; blog.db applies BLOG_SQLITE_PRAGMAS on every new connection.
+DATABASE_PROFILES = {
+    'plain': {
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {},
+        'PRAGMAS': {},
+    },
+    'tuned': {
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 5,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+
+DATABASE_PROFILE = os.environ.get('MYBLOG_DB_PROFILE', 'plain')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get('MYBLOG_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': DATABASE_PROFILES[DATABASE_PROFILE]['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': DATABASE_PROFILES[DATABASE_PROFILE]['OPTIONS'],
     }
 }
 
+BLOG_SQLITE_PRAGMAS = DATABASE_PROFILES[DATABASE_PROFILE]['PRAGMAS']
+
+# Attempts and initial backoff (seconds) of blog.db.retry_on_busy
+BLOG_BUSY_RETRIES = 5
+
+BLOG_BUSY_BACKOFF = 0.05
+
+# Read replicas (blog.routers): MYBLOG_REPLICAS=N adds N SQLite copies of the
+# default database next to it, refreshed by manage.py sync_replicas. Tests
+# mirror them onto the test database.
+BLOG_REPLICAS = ['replica%d' % i for i in range(1, int(os.environ.get('MYBLOG_REPLICAS', 0)) + 1)]
+
+for alias in BLOG_REPLICAS:
+    DATABASES[alias] = dict(DATABASES['default'], NAME='%s.%s' % (DATABASES['default']['NAME'], alias), TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['blog.routers.ReplicaRouter']
+
+BLOG_REPLICA_VIEWS = ('article', 'article_detail', 'comment', 'comment_detail')
+
+# How long a client reads from the primary after a write
+BLOG_REPLICA_STICKY_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'blog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog',
+    },
+}
+
+# Alias in CACHES used by blog.caching for article and comment list entries.
+# LocMemCache is per process: with several workers, use a shared backend and
+# a short BLOG_CACHE_TIMEOUT, or edited articles stay stale in other workers.
+BLOG_CACHE_ALIAS = 'blog'
+
+BLOG_CACHE_TIMEOUT = 300
+
+# Deleting an article with at least this many comments returns 202 and
+# finishes in manage.py run_blog_worker, see blog.deletion
+BLOG_DELETE_BACKGROUND_COMMENTS = 10000
+
+# Without a worker those deletes run in chunks within the request and return 200
+BLOG_DELETE_IN_WORKER = True
+
+# Job queue (blog.jobs): a running job is reclaimed after BLOG_JOB_TIMEOUT
+# seconds, and retries wait BLOG_JOB_RETRY_BACKOFF * 2**n seconds
+BLOG_JOB_TIMEOUT = 300
+
+BLOG_JOB_RETRY_BACKOFF = 1
+
+# Group commit for comment POSTs (blog.group_commit): one transaction per
+# BLOG_COMMENT_GROUP_COMMIT_DELAY seconds or BLOG_COMMENT_GROUP_COMMIT_SIZE
+# comments instead of one per request
+BLOG_COMMENT_GROUP_COMMIT = os.environ.get('MYBLOG_COMMENT_GROUP_COMMIT') == '1'
+
+BLOG_COMMENT_GROUP_COMMIT_SIZE = 100
+
+BLOG_COMMENT_GROUP_COMMIT_DELAY = 0.002
+
+# Seconds a request waits for its batch before withdrawing the comment with 503
+BLOG_COMMENT_GROUP_COMMIT_TIMEOUT = 10
+
+# Request bodies (blog.payloads): larger bodies get 413, longer content 400.
+# Titles are limited by the model's max_length. Django itself refuses
+# bodies over DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB), so stay below that.
+BLOG_MAX_BODY_SIZE = 1024 * 1024
+
+BLOG_MAX_BULK_BODY_SIZE = 2621440
+
+BLOG_MAX_CONTENT_LENGTH = 50000
+
+BLOG_MAX_PASSWORD_LENGTH = 4096
+
+# Comment streams (blog.live): a subscriber more than BLOG_STREAM_QUEUE_SIZE
+# events behind is dropped, and idle streams get a comment line every
+# BLOG_STREAM_KEEPALIVE seconds so proxies keep them open
+BLOG_STREAM_QUEUE_SIZE = 100
+
+BLOG_STREAM_KEEPALIVE = 15
+
+
+# Sessions and authentication
+# https://docs.djangoproject.com/en/2.1/topics/http/sessions/#configuring-the-session-engine
+# https://docs.djangoproject.com/en/2.1/topics/auth/passwords/
+
+# One of 'db', 'cached_db' or 'signed_cookies'
+SESSION_BACKEND = os.environ.get('MYBLOG_SESSION_BACKEND', 'cached_db')
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + SESSION_BACKEND
+
+# Resolves request.user from a short-lived per-process cache (blog.backends)
+AUTHENTICATION_BACKENDS = ['blog.backends.CachedModelBackend']
+
+BLOG_USER_CACHE_TTL = 5
+
+BLOG_USER_CACHE_SIZE = 10000
+
+# 'strict' is Django's default list, 'fast' lowers the PBKDF2 work factor to
+# BLOG_PBKDF2_ITERATIONS, 'test' uses MD5 and must never be used in production.
+# Only 'test' accepts MD5 hashes; the other two verify everything Django's
+# defaults do, and upgrade those hashes on login.
+PASSWORD_HASHER_PROFILES = {
+    'strict': list(global_settings.PASSWORD_HASHERS),
+    'fast': ['blog.hashers.ConfigurablePBKDF2PasswordHasher'] + global_settings.PASSWORD_HASHERS[1:],
+    'test': [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ],
+}
+
+PASSWORD_HASHER_PROFILE = os.environ.get('MYBLOG_HASHER_PROFILE', 'strict')
+
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]
+
+BLOG_PBKDF2_ITERATIONS = int(os.environ.get('MYBLOG_PBKDF2_ITERATIONS', 100000))
+
+
+# Rate limiting (blog.middleware.RateLimitMiddleware)
+# (tokens per second, burst) for reads and writes, per URL name of blog.urls;
+# 'default' applies to every name without its own entry.
+
+BLOG_RATE_LIMITS = {
+    'default': {'read': (50, 200), 'write': (10, 50)},
+    'comment': {'write': (2, 20)},
+    'article_bulk': {'write': (1, 20)},
+    'article_comment_bulk': {'write': (1, 20)},
+    'comment_bulk': {'write': (1, 20)},
+}
+
+# blog.ratelimit.LocalMemoryStore (per process) or blog.ratelimit.CacheStore
+# (shared through the CACHES alias named by BLOG_RATE_LIMIT_CACHE)
+BLOG_RATE_LIMIT_STORE = 'blog.ratelimit.LocalMemoryStore'
+
+BLOG_RATE_LIMIT_CACHE = 'default'
+
+
+# Request metrics (blog.metrics.MetricsMiddleware)
+# Serve the Prometheus text at /api/_metrics; off by default
+BLOG_METRICS_ENDPOINT = os.environ.get('MYBLOG_METRICS_ENDPOINT') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators